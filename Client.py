@@ -1,8 +1,11 @@
 import tkinter as tk
+import argparse
+import math
+import os
 import uuid
 import json
+import time
 import paho.mqtt.client as mqtt
-import threading
 
 # Thème Nord foncé
 NORD = {
@@ -20,20 +23,100 @@ NORD = {
 BROKER = "broker.hivemq.com"
 PORT = 1883
 
+# Synchronisation d'horloge avec le gestionnaire : on garde l'échange au plus court aller-retour
+NB_ECHANGES_HORLOGE = 5
+INTERVALLE_HORLOGE_MS = 200
+# QoS 0 : un échange sans réponse est relancé, dans la limite de MAX_ESSAIS_HORLOGE requêtes
+DELAI_HORLOGE_MS = 1000
+MAX_ESSAIS_HORLOGE = 3 * NB_ECHANGES_HORLOGE
+
+# quiz/fin ne porte que le haut du classement : les autres joueurs demandent leur place
+DELAI_RANG_MS = 3000
+NB_ESSAIS_RANG = 3
+
+# Identité stable du joueur entre deux lancements (historique et classements de saison)
+FICHIER_IDENTITE = os.path.join(os.path.expanduser("~"), ".quiz_mqtt_joueur.json")
+
+
+def charger_identite(chemin):
+    try:
+        with open(chemin, "r", encoding="utf-8") as f:
+            identite = json.load(f)
+        if identite.get("id"):
+            return identite
+    except (OSError, ValueError, AttributeError):
+        pass
+    identite = {"id": uuid.uuid4().hex, "nickname": ""}
+    sauvegarder_identite(chemin, identite)
+    return identite
+
+
+def sauvegarder_identite(chemin, identite):
+    try:
+        with open(chemin, "w", encoding="utf-8") as f:
+            json.dump(identite, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Identité non sauvegardée : {e}")
+
+
 class ClientQuiz:
-    def __init__(self, master):
+    def __init__(self, master, fichier_identite=FICHIER_IDENTITE):
         self.master = master
         self.master.title("🎮 Client Quiz")
         self.master.geometry("520x600")
         self.master.configure(bg=NORD["bg"])
 
-        self.client_id = str(uuid.uuid4())[:8]
+        self.fichier_identite = fichier_identite
+        self.identite = charger_identite(fichier_identite)
+        self.client_id = self.identite["id"]
         self.nickname = ""
         self.timer_id = None
         self.timer_running = False
         self.has_answered = False
+        self.connected = False
+        self.ui_ready = False
+        self.joined = False
+        self.leaderboard_list = None
+        self.pending_leaderboard = None
+
+        # Décalage horloge gestionnaire - time.monotonic() local, estimé à la connexion
+        self.clock_offset = None
+        self.best_rtt = None
+        self.echanges_horloge = 0
+        self.essais_horloge = 0
+        self.horloge_timer = None
+        self.deadline = None
+
+        # Requête "rang" de fin de partie en attente de réponse
+        self.version_fin = None
+        self.total_fin = 0
+        self.essais_rang = 0
+        self.rang_timer = None
+
+        # Mesures de démarrage (perf_counter, en secondes)
+        self.t_start = time.perf_counter()
+        self.t_connected = None
+        self.t_nickname = None
+        self.startup_reported = False
+
+        # Indicateur d'état de connexion, visible dès l'ouverture
+        self.label_status = tk.Label(master, text="🟠 Connexion au serveur...", font=("Arial", 11),
+                                     bg=NORD["header"], fg=NORD["warning"])
+        self.label_status.pack(side="bottom", fill="x")
+
+        # La connexion démarre en arrière-plan pendant la saisie du pseudo
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+        self.client.connect_async(BROKER, PORT)
+        self.client.loop_start()
 
         self.get_nickname()
+        self.t_nickname = time.perf_counter()
+        if self.nickname != self.identite.get("nickname"):
+            self.identite["nickname"] = self.nickname
+            sauvegarder_identite(self.fichier_identite, self.identite)
 
         self.label_nickname = tk.Label(master, text=f"👤 Pseudo : {self.nickname}", font=("Arial", 14, "bold"),
                                        bg=NORD["header"], fg=NORD["accent"])
@@ -62,20 +145,22 @@ class ClientQuiz:
         self.current_question = None
         self.time_left = 0
 
-        self.client = mqtt.Client()
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.connect(BROKER, PORT)
+        self.ui_ready = True
+        self.join_if_ready()
 
-        threading.Thread(target=self.client.loop_forever, daemon=True).start()
+        # Le classement n'est pas nécessaire pour la première question : construit plus tard
+        self.master.after_idle(self.build_leaderboard)
 
-        self.leaderboard_frame = tk.Frame(master, bg=NORD["bg"])
+    def build_leaderboard(self):
+        self.leaderboard_frame = tk.Frame(self.master, bg=NORD["bg"])
         self.leaderboard_frame.pack(fill="both", expand=True, pady=10)
 
         self.leaderboard_list = tk.Listbox(self.leaderboard_frame, font=("Arial", 12), bg=NORD["bg"], fg=NORD["fg"], justify="center")
         self.leaderboard_list.pack(fill="both", expand=True, anchor="center")
 
-        self.client.subscribe("quiz/classement")
+        if self.pending_leaderboard is not None:
+            self.update_leaderboard(self.pending_leaderboard)
+            self.pending_leaderboard = None
 
     def get_nickname(self):
         def submit():
@@ -94,6 +179,7 @@ class ClientQuiz:
 
         tk.Label(popup, text="Entrez votre pseudo :", bg=NORD["bg"], fg=NORD["fg"], font=("Arial", 13)).pack(pady=10)
         entry = tk.Entry(popup, font=("Arial", 13), bg=NORD["button"], fg=NORD["fg"], insertbackground=NORD["fg"])
+        entry.insert(0, self.identite.get("nickname", ""))
         entry.pack(pady=5)
         error_label = tk.Label(popup, text="", bg=NORD["bg"], fg=NORD["error"], font=("Arial", 11))
         error_label.pack(pady=5)
@@ -103,19 +189,105 @@ class ClientQuiz:
         self.master.wait_window(popup)
 
     def on_connect(self, client, userdata, flags, rc):
-        client.subscribe("quiz/question")
-        client.subscribe(f"quiz/feedback/{self.client_id}")
-        #client.subscribe(f"quiz/score/{self.client_id}")
-        client.subscribe("quiz/classement")
-        client.subscribe("quiz/fin")  # 🔥
+        # Thread réseau : on repasse dans la boucle Tk
+        self.master.after(0, self.on_connected, rc)
+
+    def on_disconnect(self, client, userdata, rc):
+        self.master.after(0, self.on_disconnected, rc)
+
+    def on_connected(self, rc):
+        if rc != 0:
+            self.label_status.config(text=f"🔴 Connexion refusée (code {rc})", fg=NORD["error"])
+            return
+        if self.t_connected is None:
+            self.t_connected = time.perf_counter()
+        self.connected = True
+        self.joined = False
+        self.label_status.config(text="🟢 Connecté", fg=NORD["success"])
+        self.join_if_ready()
+
+    def on_disconnected(self, rc):
+        self.connected = False
+        self.joined = False
+        if rc != 0:
+            self.label_status.config(text="🔴 Déconnecté, nouvelle tentative...", fg=NORD["error"])
+
+    def join_if_ready(self):
+        # La présence reste en attente tant que la connexion ou l'interface n'est pas prête
+        if not (self.connected and self.ui_ready) or self.joined:
+            return
+        self.joined = True
+        self.client.subscribe("quiz/question")
+        self.client.subscribe(f"quiz/feedback/{self.client_id}")
+        #self.client.subscribe(f"quiz/score/{self.client_id}")
+        self.client.subscribe("quiz/classement")
+        self.client.subscribe("quiz/fin")  # 🔥
+        self.client.subscribe(f"quiz/horloge/reponse/{self.client_id}")
+        self.client.subscribe(f"quiz/classement/reponse/{self.client_id}")
+
+        self.publish_presence()
+        self.report_startup()
 
+        self.echanges_horloge = 0
+        self.essais_horloge = 0
+        self.best_rtt = None
+        self.sync_horloge()
+
+    def publish_presence(self):
+        # "horloge" seulement une fois le décalage connu : sans lui, on décompte depuis la réception
+        # comme les anciens clients, et le gestionnaire doit nous laisser leur marge
         presence = {"id": self.client_id, "nickname": self.nickname}
-        client.publish("quiz/presence", json.dumps(presence))
+        if self.clock_offset is not None:
+            presence["horloge"] = True
+        self.client.publish("quiz/presence", json.dumps(presence))
+
+    def sync_horloge(self):
+        self.horloge_timer = None
+        if not self.connected or self.essais_horloge >= MAX_ESSAIS_HORLOGE:
+            return
+        self.essais_horloge += 1
+        self.client.publish("quiz/horloge/requete", json.dumps({"client_id": self.client_id, "t0": time.monotonic()}))
+        # Requête ou réponse perdue : on relance après DELAI_HORLOGE_MS
+        self.horloge_timer = self.master.after(DELAI_HORLOGE_MS, self.sync_horloge)
+
+    def handle_horloge(self, data, t3):
+        t0 = data.get("t0")
+        ts = data.get("ts")
+        if t0 is None or ts is None:
+            return
+        premier = self.clock_offset is None
+        rtt = t3 - t0
+        if self.best_rtt is None or rtt < self.best_rtt:
+            self.best_rtt = rtt
+            self.clock_offset = ts - (t0 + t3) / 2
+        if premier:
+            self.publish_presence()
+
+        if self.horloge_timer is not None:
+            self.master.after_cancel(self.horloge_timer)
+            self.horloge_timer = None
+        self.echanges_horloge += 1
+        if self.echanges_horloge < NB_ECHANGES_HORLOGE:
+            self.horloge_timer = self.master.after(INTERVALLE_HORLOGE_MS, self.sync_horloge)
+
+    def report_startup(self):
+        if self.startup_reported:
+            return
+        self.startup_reported = True
+        t_ready = time.perf_counter()
+        total_ms = (t_ready - self.t_start) * 1000
+        connect_ms = (self.t_connected - self.t_start) * 1000
+        nickname_ms = (self.t_nickname - self.t_start) * 1000
+        print(f"[démarrage] prêt pour la première question en {total_ms:.0f} ms "
+              f"(connexion : {connect_ms:.0f} ms, pseudo : {nickname_ms:.0f} ms)")
 
     def on_message(self, client, userdata, msg):
+        recu = time.monotonic()
         topic = msg.topic
         data = json.loads(msg.payload.decode())
-        if topic == "quiz/question":
+        if topic == f"quiz/horloge/reponse/{self.client_id}":
+            self.master.after(0, self.handle_horloge, data, recu)
+        elif topic == "quiz/question":
             self.master.after(0, self.display_question, data)
         elif topic == f"quiz/feedback/{self.client_id}":
             self.master.after(0, self.display_feedback, data)
@@ -123,6 +295,8 @@ class ClientQuiz:
             self.master.after(0, self.update_leaderboard, data)
         elif topic == "quiz/fin":
             self.master.after(0, self.show_final_results, data)
+        elif topic == f"quiz/classement/reponse/{self.client_id}":
+            self.master.after(0, self.display_classement_reponse, data)
 
     def display_question(self, data):
         self.stop_timer()
@@ -149,18 +323,31 @@ class ClientQuiz:
             btn.pack(pady=7)
             self.buttons.append(btn)
 
-        self.time_left = data.get("timer", 10)
+        # Échéance absolue du gestionnaire ramenée sur notre horloge monotone :
+        # le temps de transit de la question n'est plus perdu
+        timer = data.get("timer", 10)
+        maintenant = time.monotonic()
+        deadline = data.get("deadline")
+        if deadline is not None and self.clock_offset is not None:
+            self.deadline = min(deadline - self.clock_offset, maintenant + timer)
+        else:
+            self.deadline = maintenant + timer
+        self.time_left = None
         self.timer_running = True
         self.update_timer()
 
     def update_timer(self):
         if not self.timer_running:
             return
-        if self.time_left >= 0:
-            color = NORD["error"] if self.time_left <= 5 else NORD["warning"]
-            self.timer_label.config(text=f"⏳ Temps restant : {self.time_left}s", fg=color)
-            self.time_left -= 1
-            self.timer_id = self.master.after(1000, self.update_timer)
+        restant = self.deadline - time.monotonic()
+        if restant > 0:
+            secondes = math.ceil(restant)
+            if secondes != self.time_left:
+                self.time_left = secondes
+                color = NORD["error"] if secondes <= 5 else NORD["warning"]
+                self.timer_label.config(text=f"⏳ Temps restant : {secondes}s", fg=color)
+            # Réveil au prochain changement de seconde plutôt que toutes les 1000 ms (pas de dérive)
+            self.timer_id = self.master.after(max(1, int((restant - (secondes - 1)) * 1000)), self.update_timer)
         else:
             self.timer_label.config(text="⏰ Temps écoulé !", fg=NORD["error"])
             for btn in self.buttons:
@@ -186,9 +373,15 @@ class ClientQuiz:
             "answer_index": index,
             "client_id": self.client_id
         }
-        self.client.publish("quiz/reponse", json.dumps(answer))
+        # Topic propre au client : le gestionnaire peut filtrer avant de décoder
+        self.client.publish(f"quiz/reponse/{self.client_id}", json.dumps(answer))
 
     def display_feedback(self, data):
+        if data.get("trop_tard"):
+            # Réponse arrivée après l'échéance du gestionnaire : pas de correction avant la fin du temps
+            if data.get("answer_index") != -1:
+                self.result_label.config(text="⌛ Trop tard, réponse non comptée", fg=NORD["warning"])
+            return
         correct = data.get("correct", False)
         correct_index = data.get("correct_answer")
         if correct_index is None:
@@ -208,6 +401,9 @@ class ClientQuiz:
 
 
     def update_leaderboard(self, leaderboard):
+        if self.leaderboard_list is None:
+            self.pending_leaderboard = leaderboard
+            return
         self.leaderboard_list.delete(0, tk.END)
         for entry in leaderboard:
             rank = entry['rank']
@@ -217,30 +413,64 @@ class ClientQuiz:
 
     def show_final_results(self, data):
         self.stop_timer()
+        self.label_question.config(text="🎉 Quiz terminé !")
+
+        for btn in self.buttons:
+            btn.config(text="", state="disabled", bg=NORD["bg"])
 
+        # Dans le haut du classement diffusé, notre place est déjà connue
         classement = data.get("classement", [])
+        self.total_fin = data.get("total", len(classement))
         player_entry = next((p for p in classement if p.get("client_id") == self.client_id), None)
-
         if player_entry:
-            score = player_entry.get("score", 0)
-            rank = player_entry.get("rank", 0)
-            total_players = len(classement)
-
-            self.label_question.config(text="🎉 Quiz terminé !")
-            self.result_label.config(
-                text=f"🏆 Tu as répondu correctement à {score} questions.\nTa place finale : {rank}/{total_players}",
-                fg=NORD["success"]
-            )
+            self.display_place(player_entry)
+            return
+
+        # Sinon, on la demande au snapshot de la version annoncée par quiz/fin
+        self.result_label.config(text="⏳ Calcul de ta place...", fg=NORD["warning"])
+        self.version_fin = data.get("version")
+        self.essais_rang = 0
+        self.request_rang()
+
+    def request_rang(self):
+        self.essais_rang += 1
+        self.client.publish("quiz/classement/requete", json.dumps(
+            {"type": "rang", "client_id": self.client_id, "version": self.version_fin}))
+        self.rang_timer = self.master.after(DELAI_RANG_MS, self.rang_timeout)
+
+    def rang_timeout(self):
+        # QoS 0 : requête ou réponse perdue, on redemande quelques fois
+        self.rang_timer = None
+        if self.essais_rang < NB_ESSAIS_RANG:
+            self.request_rang()
         else:
-            self.result_label.config(
-                text="❓ Résultat non trouvé dans le classement.",
-                fg=NORD["error"]
-            )
+            self.result_label.config(text="❓ Le gestionnaire n'a pas donné ta place.", fg=NORD["error"])
 
-        for btn in self.buttons:
-            btn.config(text="", state="disabled", bg=NORD["bg"])
+    def display_classement_reponse(self, data):
+        if data.get("type") != "rang" or self.rang_timer is None:
+            return
+        self.master.after_cancel(self.rang_timer)
+        self.rang_timer = None
+        entrees = data.get("entrees", [])
+        if entrees:
+            self.display_place(entrees[0])
+        else:
+            self.result_label.config(text="❓ Résultat non trouvé dans le classement.", fg=NORD["error"])
+
+    def display_place(self, entree):
+        score = entree.get("score", 0)
+        rank = entree.get("rank", 0)
+        self.result_label.config(
+            text=f"🏆 Tu as répondu correctement à {score} questions.\nTa place finale : {rank}/{self.total_fin}",
+            fg=NORD["success"]
+        )
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Client du quiz MQTT.")
+    parser.add_argument("--identite", default=FICHIER_IDENTITE,
+                        help="fichier d'identité du joueur (un par joueur sur une même machine)")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = ClientQuiz(root)
+    app = ClientQuiz(root, args.identite)
     root.mainloop()
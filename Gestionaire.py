@@ -1,11 +1,20 @@
+import argparse
+import hmac
 import json
-import time
+import os
+import secrets
 import threading
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox
-from collections import defaultdict
+from tkinter import ttk, messagebox, filedialog
 import random
 import paho.mqtt.client as mqtt
+from moteur import MoteurQuiz, TOPICS, PERIODE_SPECTATEUR, PERIODE_CLASSEMENT
+from enregistrement import Enregistreur
+from profilage import PROFILEUR
+from publication import PoolPublication
+from stats import StatsJoueurs
+from banque import BanqueQuestions, MAX_CHOIX, valider_question, empreinte, importer_fichier
 
 # Thème Nord
 NORD = {
@@ -22,13 +31,6 @@ NORD = {
 
 BROKER = "broker.hivemq.com"
 PORT = 1883
-TOPICS = {
-    "question": "quiz/question",
-    "reponse": "quiz/reponse",
-    "presence": "quiz/presence",
-    "score": "quiz/score/",
-    "feedback": "quiz/feedback/"
-}
 
 # Charger toutes les questions
 with open("questions.json", "r", encoding="utf-8") as f:
@@ -76,19 +78,29 @@ class ScrollableFrame(tk.Frame):
 
 
 class GestionnaireQuiz:
-    def __init__(self, root):
+    def __init__(self, root, enregistreur=None, jeton_profil=None, connexions=1, stats=None, saison="", salle=""):
         self.root = root
-        self.clients = set()
-        self.client_scores = defaultdict(int)
-        self.answers_received = defaultdict(list)
-        self.nicknames = {}
-        self.started = False
-        self.current_question_index = 0
+        self.jeton_profil = jeton_profil
+        self.pool = None
+        if connexions > 1:
+            # Publications réparties sur plusieurs connexions, le client principal ne fait que recevoir
+            self.pool = PoolPublication(BROKER, PORT, connexions)
+            PROFILEUR.ajouter_metriques("publication", self.pool.metriques)
         self.nb_questions = tk.IntVar(value=5)
         self.custom_questions = []
+        self.banque = BanqueQuestions()
+        self.import_running = False
         self.mode_selection = tk.StringVar(value="Classiques")
         self.timer_duration = tk.IntVar(value=15)
 
+        self.moteur = MoteurQuiz(publish=self.publish_mqtt, enregistreur=enregistreur,
+                                 stats=stats, saison=saison, salle=salle)
+        self.moteur.on_players = self.update_players
+        self.moteur.on_scoreboard = self.update_scoreboard
+        self.moteur.on_question = self.show_question
+        self.moteur.on_fin = self.show_final_results
+        PROFILEUR.ajouter_metriques("admission", lambda: dict(self.moteur.metriques))
+
         self.setup_ui()
         self.setup_mqtt()
 
@@ -153,7 +165,7 @@ class GestionnaireQuiz:
         self.choices_frame = tk.Frame(create_frame, bg=NORD["bg"])
         self.choices_frame.pack(pady=5)
         self.entries_choices = []
-        self.max_choices = 6
+        self.max_choices = MAX_CHOIX
         self.init_choices(2)
 
         # Bouton pour ajouter un choix
@@ -175,6 +187,15 @@ class GestionnaireQuiz:
                                           activebackground=NORD["button_active"], relief="flat", command=self.add_custom_question, cursor="hand2")
         self.btn_add_question.pack(pady=10)
 
+        # Import en masse (CSV / JSONL) vers la banque de questions personnalisées
+        self.btn_import = tk.Button(create_frame, text="📂 Importer un fichier (CSV/JSONL)", font=("Arial", 11),
+                                    bg=NORD["button"], fg=NORD["fg"], activebackground=NORD["button_active"],
+                                    command=self.import_questions, cursor="hand2")
+        self.btn_import.pack(pady=3)
+        self.lbl_import = tk.Label(create_frame, text=f"{len(self.banque)} questions importées", font=("Arial", 11),
+                                   bg=NORD["bg"], fg=NORD["fg"])
+        self.lbl_import.pack(pady=3)
+
     def init_choices(self, n):
         # Efface les anciens champs
         for widget in self.choices_frame.winfo_children():
@@ -201,86 +222,74 @@ class GestionnaireQuiz:
         self.client.on_message = self.on_message
         self.client.connect(BROKER, PORT)
         threading.Thread(target=self.client.loop_forever, daemon=True).start()
+        threading.Thread(target=self.run_spectateur, daemon=True).start()
+        threading.Thread(target=self.run_classement, daemon=True).start()
 
     def on_connect(self, client, userdata, flags, rc):
         client.subscribe(TOPICS["presence"])
         client.subscribe(TOPICS["reponse"])
+        client.subscribe(f"{TOPICS['reponse_client']}+")
+        client.subscribe(TOPICS["classement_requete"])
+        client.subscribe(TOPICS["horloge_requete"])
+        if self.jeton_profil:
+            client.subscribe(TOPICS["controle_profil"])
 
     def on_message(self, client, userdata, msg):
+        if msg.topic == TOPICS["controle_profil"]:
+            self.handle_controle_profil(msg.payload)
+            return
+        self.moteur.on_message(msg.topic, msg.payload)
+
+    def handle_controle_profil(self, payload):
+        # Les écritures de fichiers ne doivent pas bloquer la boucle MQTT
         try:
-            data = json.loads(msg.payload.decode())
-            if msg.topic == TOPICS["presence"]:
-                self.handle_presence(data)
-            elif msg.topic == TOPICS["reponse"] and self.started:
-                self.handle_answer(data)
+            data = json.loads(payload.decode())
+            commande = data.get("commande")
+            jeton = str(data.get("jeton", ""))
         except Exception as e:
             print(f"Erreur MQTT : {e}")
-
-    def handle_presence(self, data):
-        client_id = data.get("id")
-        nickname = data.get("nickname", "").strip()
-        if not client_id:
             return
-        if not nickname:
-            nickname = f"Joueur-{client_id[:4]}"
-        if client_id not in self.clients:
-            self.clients.add(client_id)
-            self.nicknames[client_id] = nickname
-            self.update_ui()
-
-    def handle_answer(self, data):
-        qid = data.get("question_id")
-        answer = data.get("answer_index")
-        cid = data.get("client_id")
-        if cid in self.clients and qid == self.current_question_index:
-            if not any(x[0] == cid for x in self.answers_received[qid]):
-                self.answers_received[qid].append((cid, answer))
-                self.update_scoreboard(live_update=True)
-
-    def update_ui(self):
-        self.lbl_connected.config(text=f"{len(self.clients)} joueurs connectés")
-        self.update_scoreboard()
-
-    def update_scoreboard(self, live_update=False):
+        # Le topic est ouvert à tout client du broker : seul le détenteur du jeton pilote le profileur
+        if not hmac.compare_digest(jeton.encode(), self.jeton_profil.encode()):
+            print("[profil] commande refusée : jeton invalide")
+            return
+        threading.Thread(target=PROFILEUR.commande, args=(commande,), daemon=True).start()
+
+    def publish_mqtt(self, topic, payload, retain=False):
+        if self.pool:
+            self.pool.publish(topic, payload, retain)
+        else:
+            self.client.publish(topic, payload, retain=retain)
+
+    def run_spectateur(self):
+        # Un seul message retenu à débit fixe, quel que soit le nombre de spectateurs
+        while True:
+            try:
+                self.moteur.publier_spectateur()
+            except Exception as e:
+                print(f"Erreur spectateur : {e}")
+            time.sleep(PERIODE_SPECTATEUR)
+
+    def run_classement(self):
+        # Les arrivées de joueurs sont regroupées : au plus une diffusion du classement par période
+        while True:
+            try:
+                self.moteur.publier_classement()
+            except Exception as e:
+                print(f"Erreur classement : {e}")
+            time.sleep(PERIODE_CLASSEMENT)
+
+    def update_players(self, nb):
+        self.lbl_connected.config(text=f"{nb} joueurs connectés")
+
+    def update_scoreboard(self, snapshot):
         for item in self.tree.get_children():
             self.tree.delete(item)
+        for entree in snapshot.entrees:
+            self.tree.insert("", "end", values=(entree["pseudo"], f"{entree['score']}"))
 
-        all_scores = [(cid, self.client_scores.get(cid, 0)) for cid in self.clients]
-        sorted_scores = sorted(all_scores, key=lambda x: (-x[1], self.nicknames.get(x[0], "")))
-
-        last_score = None
-        last_rank = 0
-        actual_rank = 1
-
-        leaderboard = []  # Liste pour envoyer le classement
-
-        for i, (cid, score) in enumerate(sorted_scores):
-            if score == last_score:
-                rank = last_rank
-            else:
-                rank = i + 1  # 👈 Le rang devient l’index+1 (compétitif)
-
-            last_score = score
-            last_rank = rank
-
-            pseudo = self.nicknames.get(cid, cid)
-            if rank == 1:
-                pseudo = f"🏆 {pseudo}"
-            elif rank == 2:
-                pseudo = f"🥈 {pseudo}"
-            elif rank == 3:
-                pseudo = f"🥉 {pseudo}"
-
-            leaderboard.append({
-                "rank": rank,
-                "pseudo": pseudo,
-                "score": score
-            })
-
-            self.tree.insert("", "end", values=(pseudo, f"{score}"))
-
-        # Publier le classement sur un topic MQTT
-        self.client.publish("quiz/classement", json.dumps(leaderboard))
+    def show_question(self, index, total, question):
+        self.lbl_question.config(text=f"Question {index+1}/{total}\n\n{question['question']}")
 
     def add_custom_question(self):
         nb_max = self.nb_questions.get()
@@ -296,8 +305,9 @@ class GestionnaireQuiz:
         choices = [entry.get().strip() for entry in self.entries_choices if entry.get().strip()]
         correct = self.correct_choice.get()
 
-        if not qtext or len(choices) < 2 or correct >= len(choices) or correct < 0:
-            messagebox.showerror("Erreur", "Il faut au moins 2 choix, et l'index de la bonne réponse doit être correct.")
+        erreur = valider_question(qtext, choices, correct)
+        if erreur:
+            messagebox.showerror("Erreur", erreur)
             return
 
         question = {
@@ -305,6 +315,10 @@ class GestionnaireQuiz:
             "options": choices,
             "answer": correct
         }
+        digest = empreinte(question)
+        if digest in self.banque or any(empreinte(q) == digest for q in self.custom_questions):
+            messagebox.showwarning("Doublon", "Cette question existe déjà.")
+            return
         self.custom_questions.append(question)
         messagebox.showinfo("✅", f"Question ajoutée ({len(self.custom_questions)}/{nb_max}) !")
         self.entry_new_question.delete(0, tk.END)
@@ -313,9 +327,56 @@ class GestionnaireQuiz:
         self.correct_choice.set(0)
         self.init_choices(2)
 
+    def import_questions(self):
+        if self.import_running:
+            return
+        chemin = filedialog.askopenfilename(title="Importer des questions",
+                                            filetypes=[("Questions", "*.csv *.jsonl"), ("Tous les fichiers", "*.*")])
+        if not chemin:
+            return
+        self.import_running = True
+        self.btn_import.config(state="disabled")
+        self.lbl_import.config(text="⏳ Import en cours...")
+        threading.Thread(target=self.run_import, args=(chemin,), daemon=True).start()
+
+    def run_import(self, chemin):
+        # Thread d'import : l'interface n'est mise à jour que via root.after
+        erreurs = []
+
+        def progression(importees, doublons, nb_erreurs):
+            self.root.after(0, self.lbl_import.config,
+                            {"text": f"⏳ {importees} importées, {doublons} doublons, {nb_erreurs} erreurs..."})
+
+        def lot_erreurs(lot):
+            for ligne, message in lot:
+                print(f"Import {chemin}, ligne {ligne} : {message}")
+            erreurs.extend(lot[:20 - len(erreurs)])
+
+        try:
+            resultat = importer_fichier(chemin, self.banque, progression, lot_erreurs)
+        except Exception as e:
+            resultat = None
+            erreurs = [(0, str(e))]
+        self.root.after(0, self.finish_import, resultat, erreurs)
+
+    def finish_import(self, resultat, erreurs):
+        self.import_running = False
+        self.btn_import.config(state="normal")
+        self.lbl_import.config(text=f"{len(self.banque)} questions importées")
+        if resultat is None:
+            messagebox.showerror("Erreur", f"Import impossible : {erreurs[0][1]}")
+            return
+        importees, doublons, nb_erreurs = resultat
+        message = f"{importees} questions importées, {doublons} doublons ignorés, {nb_erreurs} erreurs."
+        if erreurs:
+            message += "\n\n" + "\n".join(f"Ligne {ligne} : {texte}" for ligne, texte in erreurs)
+            if nb_erreurs > len(erreurs):
+                message += "\n..."
+        messagebox.showinfo("Import terminé", message)
+
 
     def start_quiz(self):
-        if not self.clients:
+        if not self.moteur.clients:
             messagebox.showwarning("Avertissement", "Aucun joueur connecté.")
             return
 
@@ -341,75 +402,23 @@ class GestionnaireQuiz:
             if nb < 1 :
                 messagebox.showerror("Erreur", "Le nombre de questions personnalisées doit être au moins 1.")
                 return
-            if len(self.custom_questions) < nb:
+            total = len(self.custom_questions) + len(self.banque)
+            if total < nb:
                 messagebox.showerror("Erreur", "Pas assez de questions personnalisées.")
                 return
-            questions = random.sample(self.custom_questions, nb)
+            # Tirage uniforme sur les questions saisies et importées
+            tirage = random.sample(range(total), nb)
+            questions = [self.custom_questions[i] for i in tirage if i < len(self.custom_questions)]
+            questions += self.banque.tirer(nb - len(questions))
+            random.shuffle(questions)
 
-        self.questions = questions
         self.btn_start.config(state="disabled")
-        self.started = True
-        threading.Thread(target=self.run_quiz, daemon=True).start()
-
-    def run_quiz(self):
-        for index, question in enumerate(self.questions):
-            self.current_question_index = index
-            self.lbl_question.config(text=f"Question {index+1}/{len(self.questions)}\n\n{question['question']}")
-            self.answers_received[index] = []
-            self.client.publish(TOPICS["question"], json.dumps({
-                "id": index,
-                "question": question["question"],
-                "options": question["options"],
-                "timer": self.timer_duration.get()
-            }))
-            time.sleep(self.timer_duration.get() + 2)
-            correct_index = question["answer"]
-            for client_id, answer_index in self.answers_received[index]:
-                correct = (answer_index == correct_index)
-                if correct:
-                    self.client_scores[client_id] += 1
-                self.client.publish(f"{TOPICS['feedback']}{client_id}", json.dumps({
-                    "answer_index": answer_index,
-                    "correct": correct,
-                    "correct_answer": correct_index
-                }))
-            self.update_scoreboard()
-            time.sleep(4)
-        self.finish_quiz()
-
-
-    def finish_quiz(self):
-        all_scores = [(cid, self.client_scores.get(cid, 0)) for cid in self.clients]
-        sorted_scores = sorted(all_scores, key=lambda x: (-x[1], self.nicknames.get(x[0], "")))
-
-        # Générer le classement avec gestion des égalités
-        classement = []
-        last_score = None
-        last_rank = 0
-        actual_rank = 1
-
-        for i, (cid, score) in enumerate(sorted_scores):
-            if score == last_score:
-                rank = last_rank
-            else:
-                rank = i + 1  # 👈 Correction ici aussi
-
-            last_score = score
-            last_rank = rank
-
-            classement.append({
-                "client_id": cid,
-                "nickname": self.nicknames.get(cid, cid),
-                "score": score,
-                "rank": rank
-            })
-
-
-        # ✅ Publier le classement final aux clients pour qu’ils affichent leur résultat
-        self.client.publish("quiz/fin", json.dumps({"classement": classement}))
+        self.moteur.start(questions, timer)
+        threading.Thread(target=self.moteur.run_quiz, daemon=True).start()
 
+    def show_final_results(self, snapshot):
         # ✅ Afficher côté gestionnaire
-        winners = classement[:3]
+        winners = snapshot.entrees[:3]
         message = "🏅 Résultats du Quiz 🏅\n\n"
         for player in winners:
             message += f"{player['rank']}. {player['nickname']} - {player['score']} pts\n"
@@ -418,6 +427,29 @@ class GestionnaireQuiz:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestionnaire du quiz MQTT.")
+    parser.add_argument("--enregistrer", metavar="TRACE", help="enregistre la session dans une trace rejouable (replay.py)")
+    parser.add_argument("--profil", action="store_true",
+                        help=f"accepte les commandes de profilage sur {TOPICS['controle_profil']} et SIGUSR1/SIGUSR2")
+    parser.add_argument("--profil-jeton", default=os.environ.get("QUIZ_PROFIL_JETON"),
+                        help="jeton exigé dans le champ \"jeton\" des commandes de profilage "
+                             "(défaut : $QUIZ_PROFIL_JETON, sinon tiré au hasard et affiché)")
+    parser.add_argument("--connexions", type=int, default=1,
+                        help="nombre de connexions de publication (ordre conservé par topic)")
+    parser.add_argument("--saison", default=time.strftime("%Y"), help="saison des résultats enregistrés")
+    parser.add_argument("--salle", default="principale", help="salle des résultats enregistrés")
+    parser.add_argument("--sans-stats", action="store_true", help="n'enregistre pas les résultats de la session")
+    args = parser.parse_args()
+
+    enregistreur = Enregistreur(args.enregistrer) if args.enregistrer else None
+    jeton_profil = None
+    if args.profil:
+        PROFILEUR.installer_signaux()
+        jeton_profil = args.profil_jeton or secrets.token_hex(16)
+        if not args.profil_jeton:
+            print(f"[profil] jeton de contrôle : {jeton_profil}")
+    stats = None if args.sans_stats else StatsJoueurs()
     root = tk.Tk()
-    app = GestionnaireQuiz(root)
+    app = GestionnaireQuiz(root, enregistreur, jeton_profil=jeton_profil, connexions=args.connexions,
+                           stats=stats, saison=args.saison, salle=args.salle)
     root.mainloop()
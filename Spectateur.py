@@ -0,0 +1,133 @@
+import tkinter as tk
+import json
+import paho.mqtt.client as mqtt
+
+# Thème Nord foncé
+NORD = {
+    "bg": "#2E3440",
+    "fg": "#ECEFF4",
+    "accent": "#88C0D0",
+    "button": "#4C566A",
+    "button_active": "#5E81AC",
+    "success": "#A3BE8C",
+    "error": "#BF616A",
+    "warning": "#EBCB8B",
+    "header": "#3B4252"
+}
+
+BROKER = "broker.hivemq.com"
+PORT = 1883
+
+LARGEUR_BARRE = 360
+
+
+class SpectateurQuiz:
+    """Vue en lecture seule : un seul topic retenu, publié à débit fixe par le gestionnaire."""
+
+    def __init__(self, master):
+        self.master = master
+        self.master.title("📺 Spectateur Quiz")
+        self.master.geometry("620x640")
+        self.master.configure(bg=NORD["bg"])
+
+        header = tk.Frame(master, bg=NORD["header"])
+        header.pack(fill="x")
+        tk.Label(header, text="Quiz en direct", font=("Arial", 18, "bold"),
+                 bg=NORD["header"], fg=NORD["accent"]).pack(side="left", padx=10)
+        self.label_joueurs = tk.Label(header, text="", font=("Arial", 12), bg=NORD["header"], fg=NORD["fg"])
+        self.label_joueurs.pack(side="right", padx=10)
+
+        self.label_status = tk.Label(master, text="🟠 Connexion au serveur...", font=("Arial", 11),
+                                     bg=NORD["header"], fg=NORD["warning"])
+        self.label_status.pack(side="bottom", fill="x")
+
+        self.label_progression = tk.Label(master, text="En attente du lancement...", font=("Arial", 12),
+                                          bg=NORD["bg"], fg=NORD["fg"])
+        self.label_progression.pack(pady=(15, 0))
+
+        self.label_question = tk.Label(master, text="", font=("Arial", 16, "bold"),
+                                       wraplength=580, bg=NORD["bg"], fg=NORD["fg"], justify="center")
+        self.label_question.pack(pady=10)
+
+        self.timer_label = tk.Label(master, text="", font=("Arial", 14, "bold"),
+                                    bg=NORD["bg"], fg=NORD["warning"])
+        self.timer_label.pack()
+
+        # Répartition des réponses
+        self.canvas = tk.Canvas(master, bg=NORD["bg"], height=180, highlightthickness=0)
+        self.canvas.pack(fill="x", padx=20, pady=10)
+
+        tk.Label(master, text="Top 10", font=("Arial", 14, "bold"), bg=NORD["bg"], fg=NORD["accent"]).pack()
+        self.top_list = tk.Listbox(master, font=("Arial", 12), bg=NORD["bg"], fg=NORD["fg"], justify="center", height=10)
+        self.top_list.pack(fill="both", expand=True, padx=20, pady=(0, 10))
+
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+        self.client.connect_async(BROKER, PORT)
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc):
+        client.subscribe("quiz/spectateur")
+        self.master.after(0, self.label_status.config, {"text": "🟢 Connecté", "fg": NORD["success"]})
+
+    def on_disconnect(self, client, userdata, rc):
+        if rc != 0:
+            self.master.after(0, self.label_status.config,
+                              {"text": "🔴 Déconnecté, nouvelle tentative...", "fg": NORD["error"]})
+
+    def on_message(self, client, userdata, msg):
+        try:
+            data = json.loads(msg.payload.decode())
+        except ValueError:
+            return
+        self.master.after(0, self.display_etat, data)
+
+    def display_etat(self, data):
+        phase = data.get("phase", "attente")
+        self.label_joueurs.config(text=f"{data.get('joueurs', 0)} joueurs")
+
+        if phase in ("question", "correction"):
+            self.label_progression.config(text=f"Question {data.get('question_id', 0) + 1}/{data.get('total_questions', 0)}")
+            self.label_question.config(text=data.get("question", ""))
+            if phase == "question":
+                restant = data.get("temps_restant", 0)
+                color = NORD["error"] if restant <= 5 else NORD["warning"]
+                self.timer_label.config(text=f"⏳ Temps restant : {restant}s - {data.get('reponses', 0)} réponses",
+                                        fg=color)
+            else:
+                self.timer_label.config(text="⏰ Temps écoulé !", fg=NORD["error"])
+            # La répartition n'est publiée qu'à la correction ; pendant la question, les options seules
+            self.display_distribution(data.get("options", []), data.get("distribution"), data.get("correct_answer"))
+        elif phase == "fin":
+            self.label_progression.config(text="🎉 Quiz terminé !")
+            self.label_question.config(text="")
+            self.timer_label.config(text="")
+            self.canvas.delete("all")
+        elif phase == "attente":
+            self.label_progression.config(text="En attente du lancement...")
+        # "transition" (entre deux questions) : la dernière question reste affichée
+
+        self.top_list.delete(0, tk.END)
+        for entry in data.get("top", []):
+            self.top_list.insert(tk.END, f"{entry['rank']}. {entry['pseudo']} - {entry['score']} pts")
+
+    def display_distribution(self, options, distribution, correct_answer):
+        self.canvas.delete("all")
+        total = sum(distribution or []) or 1
+        for i, option in enumerate(options):
+            y = 10 + i * 28
+            self.canvas.create_text(10, y + 10, text=option[:25], anchor="w", fill=NORD["fg"], font=("Arial", 11))
+            if distribution is None:
+                continue
+            nb = distribution[i] if i < len(distribution) else 0
+            color = NORD["success"] if i == correct_answer else NORD["button_active"]
+            self.canvas.create_rectangle(200, y, 200 + LARGEUR_BARRE * nb / total, y + 20, fill=color, width=0)
+            self.canvas.create_text(210 + LARGEUR_BARRE, y + 10, text=str(nb), anchor="e", fill=NORD["fg"], font=("Arial", 11))
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = SpectateurQuiz(root)
+    root.mainloop()
@@ -0,0 +1,236 @@
+import csv
+import hashlib
+import json
+import os
+import random
+import struct
+import threading
+
+MAX_CHOIX = 6
+
+# Index : MAGIC puis une entrée (empreinte sha1, position dans le .jsonl) par question
+MAGIC_INDEX = b"QZIX1"
+ENTREE_INDEX = struct.Struct("<20sQ")
+
+TAILLE_LOT = 1000
+
+
+def valider_question(qtext, choices, correct):
+    """Règles communes à la saisie manuelle et à l'import. Renvoie un message d'erreur ou None."""
+    if not qtext:
+        return "La question est vide."
+    if len(choices) < 2:
+        return "Il faut au moins 2 choix."
+    if len(choices) > MAX_CHOIX:
+        return f"Pas plus de {MAX_CHOIX} choix."
+    if correct < 0 or correct >= len(choices):
+        return "L'index de la bonne réponse doit être correct."
+    return None
+
+
+def empreinte(question):
+    contenu = json.dumps([question["question"], question["options"], question["answer"]], ensure_ascii=False)
+    return hashlib.sha1(contenu.encode("utf-8")).digest()
+
+
+class BanqueQuestions:
+    """Questions personnalisées importées, stockées en .jsonl avec un index binaire.
+
+    Seul l'index (empreintes et positions) est gardé en mémoire : une question n'est
+    relue depuis le disque qu'au moment d'être tirée au sort.
+    """
+
+    def __init__(self, chemin="questions_perso.jsonl"):
+        self.chemin = chemin
+        self.chemin_index = os.path.splitext(chemin)[0] + ".idx"
+        self.lock = threading.Lock()
+        self.positions = []
+        self.empreintes = set()
+        self.charger_index()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, digest):
+        return digest in self.empreintes
+
+    def charger_index(self):
+        if not os.path.exists(self.chemin):
+            return
+        try:
+            with open(self.chemin_index, "rb") as f:
+                if f.read(len(MAGIC_INDEX)) != MAGIC_INDEX:
+                    raise ValueError("index invalide")
+                for digest, position in ENTREE_INDEX.iter_unpack(f.read()):
+                    self.positions.append(position)
+                    self.empreintes.add(digest)
+        except (OSError, ValueError, struct.error):
+            self.reconstruire_index()
+
+    def reconstruire_index(self):
+        # Appelé au démarrage du gestionnaire : une ligne corrompue est ignorée, jamais fatale
+        self.positions = []
+        self.empreintes = set()
+        entrees = [MAGIC_INDEX]
+        ignorees = 0
+        with open(self.chemin, "rb") as src:
+            position = 0
+            for ligne in src:
+                try:
+                    digest = empreinte(json.loads(ligne))
+                except (ValueError, TypeError, KeyError):
+                    if ligne.strip():
+                        ignorees += 1
+                else:
+                    entrees.append(ENTREE_INDEX.pack(digest, position))
+                    self.positions.append(position)
+                    self.empreintes.add(digest)
+                position += len(ligne)
+        if ignorees:
+            print(f"Banque {self.chemin} : {ignorees} ligne(s) illisible(s) ignorée(s)")
+        try:
+            with open(self.chemin_index, "wb") as idx:
+                idx.write(b"".join(entrees))
+        except OSError as e:
+            print(f"Index {self.chemin_index} non écrit : {e}")
+
+    def ajouter_lot(self, lot):
+        """Ajoute des questions (déjà validées et dédoublonnées) à la banque et à l'index."""
+        if not lot:
+            return
+        with self.lock:
+            nouvel_index = not os.path.exists(self.chemin_index)
+            with open(self.chemin, "ab") as banque, open(self.chemin_index, "ab") as idx:
+                if nouvel_index:
+                    idx.write(MAGIC_INDEX)
+                position = banque.tell()
+                lignes = []
+                entrees = []
+                for digest, question in lot:
+                    ligne = (json.dumps(question, ensure_ascii=False) + "\n").encode("utf-8")
+                    lignes.append(ligne)
+                    entrees.append(ENTREE_INDEX.pack(digest, position))
+                    self.positions.append(position)
+                    self.empreintes.add(digest)
+                    position += len(ligne)
+                banque.write(b"".join(lignes))
+                idx.write(b"".join(entrees))
+
+    def tirer(self, nb):
+        with self.lock:
+            positions = random.sample(self.positions, nb)
+        questions = []
+        with open(self.chemin, "rb") as f:
+            for position in sorted(positions):
+                f.seek(position)
+                questions.append(json.loads(f.readline()))
+        random.shuffle(questions)
+        return questions
+
+
+def _options(brutes):
+    """Options non vides, ou None si un trou précède la dernière : `answer` désigne une position."""
+    while brutes and not brutes[-1]:
+        brutes = brutes[:-1]
+    if not all(brutes):
+        return None
+    return brutes
+
+
+def lire_csv(f):
+    # Colonnes : question, answer, option1..option6, explanation (facultative)
+    for ligne, row in enumerate(csv.DictReader(f), start=2):
+        try:
+            options = _options([(row.get(f"option{i}") or "").strip() for i in range(1, MAX_CHOIX + 2)])
+            if options is None:
+                yield ligne, None, "Option vide avant la dernière option."
+                continue
+            question = {
+                "question": (row.get("question") or "").strip(),
+                "options": options,
+                "answer": int(row.get("answer") or -1)
+            }
+        except ValueError:
+            yield ligne, None, "La bonne réponse doit être un entier."
+            continue
+        if row.get("explanation"):
+            question["explanation"] = row["explanation"].strip()
+        yield ligne, question, None
+
+
+def lire_jsonl(f):
+    # Une question par ligne, au format de questions.json
+    for ligne, texte in enumerate(f, start=1):
+        if not texte.strip():
+            continue
+        try:
+            data = json.loads(texte)
+            options = data.get("options", [])
+            if not isinstance(options, list):
+                yield ligne, None, "Les options doivent être une liste."
+                continue
+            options = _options([str(o).strip() for o in options])
+            if options is None:
+                yield ligne, None, "Option vide avant la dernière option."
+                continue
+            question = {
+                "question": str(data.get("question", "")).strip(),
+                "options": options,
+                "answer": int(data.get("answer", -1))
+            }
+        except (ValueError, TypeError, AttributeError):
+            yield ligne, None, "Ligne JSON invalide."
+            continue
+        if data.get("explanation"):
+            question["explanation"] = str(data["explanation"]).strip()
+        yield ligne, question, None
+
+
+def importer_fichier(chemin, banque, on_progression=None, on_erreurs=None, taille_lot=TAILLE_LOT):
+    """Importe un fichier CSV ou JSONL en flux dans la banque.
+
+    Les questions valides sont écrites par lots de `taille_lot` ; les erreurs sont
+    remontées par lots via `on_erreurs([(ligne, message), ...])`.
+    Renvoie (importées, doublons, erreurs).
+    """
+    lecteur = lire_csv if chemin.lower().endswith(".csv") else lire_jsonl
+    importees = doublons = nb_erreurs = 0
+    lot = []
+    erreurs = []
+    vues = set()
+
+    # utf-8-sig : les CSV enregistrés par Excel commencent par un BOM
+    with open(chemin, "r", encoding="utf-8-sig", newline="") as f:
+        for ligne, question, erreur in lecteur(f):
+            if erreur is None:
+                erreur = valider_question(question["question"], question["options"], question["answer"])
+            if erreur is not None:
+                nb_erreurs += 1
+                erreurs.append((ligne, erreur))
+                if len(erreurs) >= taille_lot:
+                    if on_erreurs:
+                        on_erreurs(erreurs)
+                    erreurs = []
+                continue
+
+            digest = empreinte(question)
+            if digest in vues or digest in banque:
+                doublons += 1
+                continue
+            vues.add(digest)
+            lot.append((digest, question))
+
+            if len(lot) >= taille_lot:
+                banque.ajouter_lot(lot)
+                importees += len(lot)
+                lot = []
+                if on_progression:
+                    on_progression(importees, doublons, nb_erreurs)
+
+    banque.ajouter_lot(lot)
+    importees += len(lot)
+    if erreurs and on_erreurs:
+        on_erreurs(erreurs)
+    if on_progression:
+        on_progression(importees, doublons, nb_erreurs)
+    return importees, doublons, nb_erreurs
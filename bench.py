@@ -0,0 +1,230 @@
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from moteur import MoteurQuiz, TOPICS
+
+TAILLES = [10, 1000, 10000, 100000]
+# Nombre de messages mesurés par scénario : le coût par message est mesuré à population N
+OPERATIONS = 1000
+# Une répétition enchaîne des passes jusqu'à DUREE_MIN secondes, on garde la meilleure répétition
+REPETITIONS = 7
+DUREE_MIN = 0.2
+REFERENCE = "bench_reference.json"
+# Au-delà de ce ratio par rapport à la référence, le scénario est signalé.
+# Trois passes consécutives sur une même machine partagée ont varié de 0.6x à 1.5x : le seuil
+# ne repère que les changements d'ordre de grandeur, pas les écarts de quelques pourcents.
+SEUIL_REGRESSION = 2.0
+
+
+def moteur_vide(clock=None):
+    # Par défaut l'horloge avance d'une minute à chaque lecture : le limiteur de débit
+    # ne refuse jamais les passes répétées d'un même joueur
+    if clock is None:
+        clock = itertools.count(0, 60).__next__
+    return MoteurQuiz(publish=lambda topic, payload, retain=False: None, sleep=lambda duree: None, clock=clock)
+
+
+def rien():
+    pass
+
+
+def inscrire(moteur, n):
+    for i in range(n):
+        cid = f"c{i:07d}"
+        moteur.clients.add(cid)
+        moteur.nicknames[cid] = f"Joueur {i}"
+    moteur.scores_dirty = True
+
+
+def presences(n):
+    # Une présence ne fait que marquer le classement à reconstruire : coût indépendant de N
+    nb = min(n, OPERATIONS)
+    moteur = moteur_vide()
+    inscrire(moteur, n - nb)
+    moteur.update_scoreboard()
+    nouveaux = [f"n{i:07d}" for i in range(nb)]
+    messages = [json.dumps({"id": cid, "nickname": f"Nouveau {i}"}).encode() for i, cid in enumerate(nouveaux)]
+
+    def preparer():
+        for cid in nouveaux:
+            moteur.clients.discard(cid)
+            moteur.clients_anciens.discard(cid)
+            moteur.nicknames.pop(cid, None)
+
+    def run():
+        for payload in messages:
+            moteur.on_message(TOPICS["presence"], payload)
+    return preparer, run, nb
+
+
+def reponses(n):
+    # Dédoublonnage de handle_answer quand N-nb joueurs ont déjà répondu
+    nb = min(n, OPERATIONS)
+    moteur = moteur_vide()
+    inscrire(moteur, n)
+    moteur.started = True
+    moteur.update_scoreboard()
+    ids = sorted(moteur.clients)
+    deja = {cid: 0 for cid in ids[:n - nb]}
+    messages = [(f"{TOPICS['reponse_client']}{cid}", json.dumps({"question_id": 0, "answer_index": 1, "client_id": cid}).encode())
+                for cid in ids[n - nb:]]
+
+    def preparer():
+        moteur.answers_received[0] = dict(deja)
+
+    def run():
+        for topic, payload in messages:
+            moteur.on_message(topic, payload)
+    return preparer, run, nb
+
+
+def rejets(n):
+    # Coût d'un message refusé par le filtre d'admission : inconnu, trop gros, ou client qui inonde.
+    # Horloge figée : le seau du client qui inonde ne se remplit jamais
+    moteur = moteur_vide(clock=lambda: 0.0)
+    inscrire(moteur, n)
+    moteur.started = True
+    moteur.update_scoreboard()
+    flood = f"{TOPICS['reponse_client']}c0000000"
+    payload = json.dumps({"question_id": 0, "answer_index": 1, "client_id": "c0000000"}).encode()
+    messages = [(f"{TOPICS['reponse_client']}intrus", payload), (flood, b"x" * 4096), (flood, payload)] * (OPERATIONS // 3)
+
+    def run():
+        for topic, data in messages:
+            moteur.on_message(topic, data)
+    return rien, run, len(messages)
+
+
+def classement(n):
+    moteur = moteur_vide()
+    inscrire(moteur, n)
+    for cid in moteur.clients:
+        moteur.client_scores[cid] = random.randint(0, 20)
+
+    def run():
+        moteur.scores_dirty = True
+        moteur.update_scoreboard()
+    return rien, run, 1
+
+
+def fin(n):
+    moteur = moteur_vide()
+    inscrire(moteur, n)
+    for cid in moteur.clients:
+        moteur.client_scores[cid] = random.randint(0, 20)
+
+    def run():
+        moteur.scores_dirty = True
+        moteur.finish_quiz()
+    return rien, run, 1
+
+
+def codec(n):
+    # Encodage côté gestionnaire et décodage côté client du classement diffusé
+    moteur = moteur_vide()
+    inscrire(moteur, n)
+    leaderboard = json.loads(moteur.get_snapshot().payload_classement())
+
+    def run():
+        json.loads(json.dumps(leaderboard))
+    return rien, run, 1
+
+
+SCENARIOS = {
+    "presence": presences,
+    "reponse": reponses,
+    "rejet": rejets,
+    "classement": classement,
+    "fin": fin,
+    "codec": codec
+}
+
+
+def mesurer(scenario, n):
+    """Coût par opération : minimum et médiane sur REPETITIONS répétitions d'au moins DUREE_MIN secondes."""
+    random.seed(n)
+    preparer, run, nb = SCENARIOS[scenario](n)
+    par_op = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(REPETITIONS):
+            total = 0.0
+            operations = 0
+            while total < DUREE_MIN:
+                preparer()
+                debut = time.perf_counter()
+                run()
+                total += time.perf_counter() - debut
+                operations += nb
+            par_op.append(total / operations)
+    finally:
+        gc.enable()
+
+    preparer()
+    tracemalloc.start()
+    run()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    meilleur = min(par_op)
+    return {"ops_s": 1 / meilleur, "us_op": meilleur * 1e6,
+            "us_op_median": statistics.median(par_op) * 1e6, "pic_kio": pic / 1024}
+
+
+def comparer(resultats, reference):
+    regressions = 0
+    print(f"{'scénario':<12}{'N':>8}{'µs/op':>14}{'médiane':>14}{'réf.':>14}{'ratio':>9}{'pic Kio':>12}")
+    for cle, r in resultats.items():
+        scenario, n = cle.split("/")
+        ref = reference.get(cle)
+        if ref:
+            ratio = r["us_op"] / ref["us_op"]
+            marque = " ❌" if ratio > SEUIL_REGRESSION else (" ✅" if ratio < 1 / SEUIL_REGRESSION else "")
+            regressions += ratio > SEUIL_REGRESSION
+            print(f"{scenario:<12}{n:>8}{r['us_op']:>14.1f}{r['us_op_median']:>14.1f}{ref['us_op']:>14.1f}"
+                  f"{ratio:>8.2f}x{r['pic_kio']:>12.0f}{marque}")
+        else:
+            print(f"{scenario:<12}{n:>8}{r['us_op']:>14.1f}{r['us_op_median']:>14.1f}{'-':>14}{'-':>9}{r['pic_kio']:>12.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks du moteur de quiz (sans interface ni broker).")
+    parser.add_argument("--tailles", default=",".join(map(str, TAILLES)), help="nombres de joueurs, séparés par des virgules")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="scénarios à lancer")
+    parser.add_argument("--reference", default=REFERENCE, help="fichier de référence à comparer")
+    parser.add_argument("--enregistrer-reference", action="store_true", help="écrit les résultats comme nouvelle référence")
+    args = parser.parse_args()
+
+    resultats = {}
+    for scenario in args.scenarios.split(","):
+        for n in map(int, args.tailles.split(",")):
+            resultats[f"{scenario}/{n}"] = mesurer(scenario, n)
+            print(f"  {scenario}/{n} : {resultats[f'{scenario}/{n}']['us_op']:.1f} µs/op", file=sys.stderr)
+
+    reference = {}
+    if os.path.exists(args.reference):
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = json.load(f)
+    regressions = comparer(resultats, reference)
+
+    if args.enregistrer_reference:
+        reference.update(resultats)
+        with open(args.reference, "w", encoding="utf-8") as f:
+            json.dump(reference, f, indent=4, sort_keys=True)
+        print(f"Référence enregistrée dans {args.reference}")
+    elif regressions:
+        print(f"{regressions} régression(s) au-delà de x{SEUIL_REGRESSION}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import json
+
+MEDAILLES = {1: "🏆", 2: "🥈", 3: "🥉"}
+
+TAILLE_PAGE_MAX = 100
+RAYON_MAX = 25
+# Entrées diffusées sur quiz/classement et quiz/fin ; le reste s'obtient par requête
+TOP_DIFFUSION = 10
+
+
+class SnapshotClassement:
+    """Classement figé d'une version donnée.
+
+    Les payloads diffusés (quiz/classement, quiz/fin) sont sérialisés une seule fois ;
+    les réponses aux requêtes dépendent de paramètres choisis par le client et ne sont
+    pas mises en cache.
+    """
+
+    __slots__ = ("version", "question", "entrees", "_positions", "_cache")
+
+    def __init__(self, version, question, entrees):
+        self.version = version
+        self.question = question
+        self.entrees = tuple(entrees)
+        self._positions = {e["client_id"]: i for i, e in enumerate(self.entrees)}
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.entrees)
+
+    def position(self, client_id):
+        return self._positions.get(client_id)
+
+    def entree(self, client_id):
+        i = self._positions.get(client_id)
+        return None if i is None else self.entrees[i]
+
+    def payload_classement(self):
+        # Format historique de quiz/classement, limité au haut du classement
+        return self._serialise("classement", lambda: [
+            {"rank": e["rank"], "pseudo": e["pseudo"], "score": e["score"]} for e in self.entrees[:TOP_DIFFUSION]
+        ])
+
+    def payload_fin(self):
+        # Haut du classement et effectif : chaque joueur demande sa propre place par requête "rang"
+        return self._serialise("fin", lambda: {
+            "version": self.version,
+            "total": len(self.entrees),
+            "classement": [
+                {"client_id": e["client_id"], "nickname": e["nickname"], "score": e["score"], "rank": e["rank"]}
+                for e in self.entrees[:TOP_DIFFUSION]
+            ]
+        })
+
+    def rang(self, client_id):
+        entree = self.entree(client_id)
+        return self._reponse("rang", [entree] if entree else [])
+
+    def page(self, numero, taille):
+        taille = max(1, min(int(taille), TAILLE_PAGE_MAX))
+        debut = max(0, int(numero)) * taille
+        return self._reponse("page", self.entrees[debut:debut + taille])
+
+    def autour(self, client_id, rayon=5):
+        rayon = max(0, min(int(rayon), RAYON_MAX))
+        i = self._positions.get(client_id)
+        if i is None:
+            return self._reponse("autour", [])
+        return self._reponse("autour", self.entrees[max(0, i - rayon):i + rayon + 1])
+
+    def _reponse(self, kind, entrees):
+        # Au plus TAILLE_PAGE_MAX entrées : sérialisation bornée, pas de cache
+        return json.dumps({
+            "type": kind,
+            "version": self.version,
+            "question": self.question,
+            "total": len(self.entrees),
+            "entrees": list(entrees)
+        })
+
+    def _serialise(self, cle, contenu):
+        payload = self._cache.get(cle)
+        if payload is None:
+            payload = json.dumps(contenu())
+            self._cache[cle] = payload
+        return payload
+
+
+def construire_classement(version, question, clients, scores, nicknames):
+    # client_id en dernier : l'ordre des homonymes ex aequo ne dépend pas du hash des chaînes
+    sorted_scores = sorted(((cid, scores.get(cid, 0)) for cid in clients),
+                           key=lambda x: (-x[1], nicknames.get(x[0], ""), x[0]))
+
+    # Classement compétitif : les ex aequo partagent le rang, le suivant saute
+    entrees = []
+    last_score = None
+    last_rank = 0
+    for i, (cid, score) in enumerate(sorted_scores):
+        rank = last_rank if score == last_score else i + 1
+        last_score = score
+        last_rank = rank
+
+        nickname = nicknames.get(cid, cid)
+        medaille = MEDAILLES.get(rank)
+        entrees.append({
+            "client_id": cid,
+            "nickname": nickname,
+            "pseudo": f"{medaille} {nickname}" if medaille else nickname,
+            "score": score,
+            "rank": rank
+        })
+    return SnapshotClassement(version, question, entrees)
+
+
+def repondre_requete(snapshot, data):
+    """Répond à une requête quiz/classement/requete depuis un snapshot, ou None si invalide."""
+    kind = data.get("type")
+    try:
+        if kind == "rang":
+            return snapshot.rang(data.get("client_id"))
+        if kind == "page":
+            return snapshot.page(data.get("page", 0), data.get("taille", 10))
+        if kind == "autour":
+            return snapshot.autour(data.get("client_id"), data.get("rayon", 5))
+    except (TypeError, ValueError):
+        return None
+    return None
@@ -0,0 +1,78 @@
+import json
+import struct
+import threading
+import time
+
+# Format d'une trace :
+#   en-tête  : MAGIC (5 octets)
+#   entrée   : ENTETE_ENTREE (instant, type, longueur topic, longueur payload) puis topic et payload bruts
+MAGIC = b"QZTR1"
+ENTETE_ENTREE = struct.Struct("<dBHI")
+
+ENTRANT = 0
+SORTANT = 1
+EVENEMENT = 2
+
+EVENEMENT_DEMARRAGE = "gestionnaire/demarrage"
+
+
+def _octets(payload):
+    return payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+
+
+class Enregistreur:
+    """Enregistre les messages entrants et sortants du gestionnaire dans une trace binaire."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.fichier = open(chemin, "wb")
+        self.fichier.write(MAGIC)
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic()
+
+    def _ecrire(self, kind, topic, payload):
+        instant = time.monotonic() - self.t0
+        topic = topic.encode("utf-8")
+        payload = _octets(payload)
+        with self.lock:
+            self.fichier.write(ENTETE_ENTREE.pack(instant, kind, len(topic), len(payload)))
+            self.fichier.write(topic)
+            self.fichier.write(payload)
+
+    def entrant(self, topic, payload):
+        self._ecrire(ENTRANT, topic, payload)
+
+    def sortant(self, topic, payload):
+        self._ecrire(SORTANT, topic, payload)
+
+    def demarrage(self, questions, timer):
+        # Les questions tirées au sort ne sont pas dans les messages publiés (pas de réponse) : on les garde à part
+        self._ecrire(EVENEMENT, EVENEMENT_DEMARRAGE, json.dumps({"questions": questions, "timer": timer}))
+
+    def flush(self):
+        with self.lock:
+            self.fichier.flush()
+
+    def close(self):
+        with self.lock:
+            self.fichier.close()
+
+
+def lire_trace(chemin):
+    """Générateur des entrées (instant, type, topic, payload) d'une trace."""
+    with open(chemin, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{chemin} n'est pas une trace de quiz")
+        while True:
+            entete = f.read(ENTETE_ENTREE.size)
+            if not entete:
+                return
+            if len(entete) < ENTETE_ENTREE.size:
+                return  # Dernière entrée tronquée (gestionnaire arrêté en cours d'écriture)
+            instant, kind, taille_topic, taille_payload = ENTETE_ENTREE.unpack(entete)
+            topic = f.read(taille_topic)
+            payload = f.read(taille_payload)
+            if len(topic) < taille_topic or len(payload) < taille_payload:
+                return
+            topic = topic.decode("utf-8")
+            yield instant, kind, topic, payload
@@ -0,0 +1,435 @@
+import json
+import time
+import threading
+from collections import defaultdict, Counter
+from classement import construire_classement, repondre_requete
+from profilage import PROFILEUR
+from banque import empreinte
+
+TOPICS = {
+    "question": "quiz/question",
+    "reponse": "quiz/reponse",
+    "reponse_client": "quiz/reponse/",
+    "presence": "quiz/presence",
+    "score": "quiz/score/",
+    "feedback": "quiz/feedback/",
+    "classement": "quiz/classement",
+    "classement_requete": "quiz/classement/requete",
+    "classement_reponse": "quiz/classement/reponse/",
+    "horloge_requete": "quiz/horloge/requete",
+    "horloge_reponse": "quiz/horloge/reponse/",
+    "fin": "quiz/fin",
+    "controle_profil": "quiz/controle/profil",
+    "spectateur": "quiz/spectateur"
+}
+
+# Pause après la correction, avant la question suivante
+PAUSE_CORRECTION = 4
+# Les questions portent une échéance absolue sur l'horloge du gestionnaire (clock) :
+# une réponse arrivée plus de TOLERANCE_RETARD après est refusée, et la correction
+# part DELAI_GRACE après l'échéance.
+TOLERANCE_RETARD = 0.3
+DELAI_GRACE = 0.5
+# Les clients sans "horloge" dans leur présence (anciens, ou pas encore synchronisés) décomptent
+# depuis la réception de la question : tant qu'il en reste un, on garde la marge historique de 2 s.
+TOLERANCE_ANCIENS = 1.8
+DELAI_GRACE_ANCIENS = 2.0
+# Période de l'état agrégé publié pour les spectateurs (secondes)
+PERIODE_SPECTATEUR = 1.0
+TOP_SPECTATEUR = 10
+
+# Contrôle d'admission : tailles maximales des payloads (octets) et débit par client
+TAILLE_MAX_REPONSE = 256
+TAILLE_MAX_PRESENCE = 256
+TAILLE_MAX_PAYLOAD = 2048
+# Le registre des joueurs est rempli par quiz/presence, ouvert à tous : il est borné
+MAX_JOUEURS = 100000
+# Les arrivées ne republient pas le classement une à une : publier_classement() le fait à cette période
+PERIODE_CLASSEMENT = 1.0
+DEBIT_REPONSES = 1.0  # jetons par seconde
+RAFALE_REPONSES = 5
+# Au-delà, les seaux les moins récemment utilisés sont oubliés (un seau oublié repart plein)
+MAX_SEAUX = 250000
+
+
+class LimiteurDebit:
+    """Seau à jetons par client : `rafale` messages d'affilée, puis `taux` par seconde."""
+
+    def __init__(self, taux, rafale, clock, max_seaux=MAX_SEAUX):
+        self.taux = taux
+        self.rafale = rafale
+        self.clock = clock
+        self.max_seaux = max_seaux
+        self.seaux = {}  # clé -> (jetons, dernier), du moins au plus récemment utilisé
+
+    def autoriser(self, cle):
+        maintenant = self.clock()
+        jetons, dernier = self.seaux.pop(cle, (self.rafale, maintenant))
+        jetons = min(self.rafale, jetons + (maintenant - dernier) * self.taux)
+        autorise = jetons >= 1
+        self.seaux[cle] = (jetons - 1 if autorise else jetons, maintenant)
+        if len(self.seaux) > self.max_seaux:
+            del self.seaux[next(iter(self.seaux))]
+        return autorise
+
+
+class MoteurQuiz:
+    """Logique du quiz sans interface ni broker.
+
+    Les messages sortants passent par `publish(topic, payload)` et les attentes
+    par `sleep(secondes)` : le gestionnaire branche paho et time.sleep, le rejeu
+    une collecte en mémoire et une horloge virtuelle.
+    """
+
+    def __init__(self, publish, sleep=time.sleep, clock=time.monotonic, enregistreur=None,
+                 stats=None, saison="", salle=""):
+        self.transport = publish
+        self.sleep = sleep
+        self.clock = clock
+        self.enregistreur = enregistreur
+        self.stats = stats
+        self.saison = saison
+        self.salle = salle
+
+        self.clients = set()
+        self.clients_anciens = set()
+        self.client_scores = defaultdict(int)
+        self.answers_received = defaultdict(dict)  # question -> {client_id: réponse}, dans l'ordre d'arrivée
+        self.nicknames = {}
+        self.started = False
+        self.current_question_index = 0
+        self.questions = []
+        self.timer = 15
+        # phase et current_question_index changent ensemble sous etat_lock : la vue spectateur
+        # ne doit jamais associer la phase "correction" à la question suivante
+        self.etat_lock = threading.Lock()
+        self.phase = "attente"
+        self.deadline = None
+        self.distribution = []
+        self.last_spectateur = None
+
+        self.limiteur = LimiteurDebit(DEBIT_REPONSES, RAFALE_REPONSES, clock)
+        self.metriques = Counter()
+
+        # Snapshots de classement versionnés (un par question)
+        self.snapshot_lock = threading.Lock()
+        self.snapshot = None
+        self.snapshots = {}
+        self.snapshot_version = 0
+        self.snapshot_fin = None  # celui annoncé par quiz/fin, gardé pour les requêtes "rang"
+        self.scores_dirty = True
+        self.last_published_version = None
+
+        # Points d'accroche pour l'interface (aucun par défaut)
+        self.on_players = None
+        self.on_scoreboard = None
+        self.on_question = None
+        self.on_fin = None
+
+    def publish(self, topic, payload, retain=False):
+        if self.enregistreur:
+            self.enregistreur.sortant(topic, payload)
+        self.transport(topic, payload, retain)
+
+    @PROFILEUR.chrono("on_message")
+    def on_message(self, topic, payload):
+        if self.enregistreur:
+            self.enregistreur.entrant(topic, payload)
+
+        # Filtre d'admission : tout ce qui peut être refusé l'est avant json.loads
+        topic_client = None
+        recu = self.clock()
+        if topic.startswith(TOPICS["reponse_client"]):
+            topic_client = topic[len(TOPICS["reponse_client"]):]
+            raison = self.admettre_reponse(topic_client, payload)
+        elif topic == TOPICS["reponse"]:
+            raison = self.admettre_reponse(None, payload)
+        elif topic == TOPICS["presence"]:
+            raison = "taille" if len(payload) > TAILLE_MAX_PRESENCE else None
+        else:
+            raison = "taille" if len(payload) > TAILLE_MAX_PAYLOAD else None
+        if raison:
+            self.metriques[f"rejet_{raison}"] += 1
+            return
+
+        try:
+            data = json.loads(payload.decode())
+            cid = data.get("client_id")
+            if topic_client is not None or topic == TOPICS["reponse"]:
+                if topic_client is not None and cid != topic_client:
+                    self.metriques["rejet_usurpation"] += 1
+                    return
+                if topic_client is None and self.refuser(cid, cid):
+                    return
+                self.handle_answer(data, recu)
+            elif topic == TOPICS["presence"]:
+                raison = self.handle_presence(data)
+                if raison:
+                    self.metriques[f"rejet_{raison}"] += 1
+                    return
+            elif topic == TOPICS["horloge_requete"]:
+                if self.refuser(cid, ("horloge", cid)):
+                    return
+                self.handle_horloge(data, recu)
+            elif topic == TOPICS["classement_requete"]:
+                if self.refuser(cid, cid):
+                    return
+                self.handle_classement_request(data)
+            self.metriques["accepte"] += 1
+        except Exception as e:
+            self.metriques["rejet_invalide"] += 1
+            print(f"Erreur MQTT : {e}")
+
+    def admettre_reponse(self, client_id, payload):
+        """Renvoie la raison du refus d'une réponse, ou None si elle peut être décodée."""
+        if len(payload) > TAILLE_MAX_REPONSE:
+            return "taille"
+        if not self.started:
+            return "hors_quiz"
+        if client_id is None:
+            return None  # Ancien topic commun : l'identifiant n'est connu qu'après décodage
+        if client_id not in self.clients:
+            return "inconnu"
+        if not self.limiteur.autoriser(client_id):
+            return "debit"
+        return None
+
+    def refuser(self, client_id, cle):
+        """Après décodage : joueur inconnu ou seau `cle` vide. Compte le refus et renvoie True."""
+        if client_id not in self.clients:
+            self.metriques["rejet_inconnu"] += 1
+            return True
+        if not self.limiteur.autoriser(cle):
+            self.metriques["rejet_debit"] += 1
+            return True
+        return False
+
+    def handle_presence(self, data):
+        """Inscrit un joueur. Renvoie la raison du refus, ou None.
+
+        Coût constant : le classement est seulement marqué à reconstruire, publier_classement()
+        le diffuse à débit fixe quel que soit le nombre d'arrivées.
+        """
+        client_id = data.get("id")
+        nickname = data.get("nickname", "").strip()
+        if not client_id or not isinstance(client_id, str):
+            return "invalide"
+        if not nickname:
+            nickname = f"Joueur-{client_id[:4]}"
+        if client_id in self.clients:
+            # Un client annonce "horloge" une fois synchronisé, après sa première présence
+            if data.get("horloge"):
+                self.clients_anciens.discard(client_id)
+        else:
+            if len(self.clients) >= MAX_JOUEURS:
+                return "complet"
+            self.clients.add(client_id)
+            if not data.get("horloge"):
+                self.clients_anciens.add(client_id)
+            self.nicknames[client_id] = nickname
+            self.scores_dirty = True
+            if self.on_players:
+                self.on_players(len(self.clients))
+        return None
+
+    def publier_classement(self):
+        """Publie le classement s'il a changé depuis la dernière publication (appel périodique)."""
+        self.update_scoreboard(live_update=True)
+
+    @PROFILEUR.chrono("handle_answer")
+    def handle_answer(self, data, recu=None):
+        qid = data.get("question_id")
+        answer = data.get("answer_index")
+        cid = data.get("client_id")
+        if cid in self.clients and qid == self.current_question_index:
+            tolerance = TOLERANCE_ANCIENS if cid in self.clients_anciens else TOLERANCE_RETARD
+            if self.deadline is not None and recu is not None and recu > self.deadline + tolerance:
+                self.metriques["rejet_retard"] += 1
+                # Sans retour, le joueur qui a cliqué ne verrait rien ; la bonne réponse n'est pas jointe
+                self.publish(f"{TOPICS['feedback']}{cid}", json.dumps({
+                    "answer_index": answer,
+                    "correct": False,
+                    "trop_tard": True
+                }))
+                return
+            if cid not in self.answers_received[qid]:
+                self.answers_received[qid][cid] = answer
+                if isinstance(answer, int) and 0 <= answer < len(self.distribution):
+                    self.distribution[answer] += 1
+                self.update_scoreboard(live_update=True)
+
+    def get_snapshot(self):
+        with self.snapshot_lock:
+            if self.scores_dirty or self.snapshot is None:
+                self.scores_dirty = False
+                self.snapshot_version += 1
+                self.snapshot = construire_classement(self.snapshot_version, self.current_question_index,
+                                                      self.clients, self.client_scores, self.nicknames)
+                self.snapshots[self.current_question_index] = self.snapshot
+            return self.snapshot
+
+    @PROFILEUR.chrono("update_scoreboard")
+    def update_scoreboard(self, live_update=False):
+        snapshot = self.get_snapshot()
+        # Une réponse ne change pas les scores : inutile de redessiner et republier la même version
+        if live_update and snapshot.version == self.last_published_version:
+            return
+        self.last_published_version = snapshot.version
+
+        if self.on_scoreboard:
+            self.on_scoreboard(snapshot)
+
+        # Publier le classement sur un topic MQTT
+        self.publish(TOPICS["classement"], snapshot.payload_classement())
+
+    def handle_classement_request(self, data):
+        client_id = data.get("client_id")
+        if client_id not in self.clients:
+            return
+        question = data.get("question")
+        version = data.get("version")
+        if version is not None:
+            # Version annoncée par quiz/fin : un joueur arrivé depuis ne change pas la place demandée
+            candidats = [self.snapshot_fin] + list(self.snapshots.values())
+            snapshot = next((s for s in candidats if s is not None and s.version == version), None) \
+                or self.get_snapshot()
+        elif question is not None:
+            snapshot = self.snapshots.get(question)
+        else:
+            snapshot = self.get_snapshot()
+        if snapshot is None:
+            return
+        payload = repondre_requete(snapshot, data)
+        if payload is not None:
+            self.publish(f"{TOPICS['classement_reponse']}{client_id}", payload)
+
+    def handle_horloge(self, data, recu):
+        # Échange de synchronisation : le client estime son décalage à partir de t0, ts et de l'heure de réception
+        client_id = data.get("client_id")
+        if client_id not in self.clients:
+            return
+        self.publish(f"{TOPICS['horloge_reponse']}{client_id}", json.dumps({"t0": data.get("t0"), "ts": recu}))
+
+    def start(self, questions, timer):
+        self.questions = questions
+        self.timer = timer
+        if self.enregistreur:
+            self.enregistreur.demarrage(questions, timer)
+        self.started = True
+
+    def run_quiz(self):
+        # Planning en temps absolu : la durée de reveal (un feedback par joueur, redessin Tk)
+        # ne décale pas les échéances suivantes, qui restent identiques au rejeu
+        debut = self.clock()
+        for index, question in enumerate(self.questions):
+            with self.etat_lock:
+                self.phase = "transition"
+                self.current_question_index = index
+            if self.on_question:
+                self.on_question(index, len(self.questions), question)
+            self.publish_question(index, question, debut)
+            grace = DELAI_GRACE_ANCIENS if self.clients_anciens else DELAI_GRACE
+            self.sleep(max(0, self.deadline + grace - self.clock()))
+            self.reveal(index, question)
+            debut = self.deadline + grace + PAUSE_CORRECTION
+            self.sleep(max(0, debut - self.clock()))
+        snapshot = self.finish_quiz()
+        if self.stats:
+            self.stats.enregistrer_session_async(self.bilan_session(snapshot), self.saison, self.salle)
+        # Hors de finish_quiz : la fenêtre de résultats bloque jusqu'à sa fermeture
+        if self.on_fin:
+            self.on_fin(snapshot)
+
+    @PROFILEUR.chrono("publish_question")
+    def publish_question(self, index, question, debut=None):
+        with self.etat_lock:
+            self.answers_received[index] = {}
+            self.distribution = [0] * len(question["options"])
+            self.deadline = (self.clock() if debut is None else debut) + self.timer
+            self.phase = "question"
+        self.publish(TOPICS["question"], json.dumps({
+            "id": index,
+            "question": question["question"],
+            "options": question["options"],
+            "timer": self.timer,
+            "deadline": self.deadline
+        }))
+
+    @PROFILEUR.chrono("reveal")
+    def reveal(self, index, question):
+        with self.etat_lock:
+            self.phase = "correction"
+        correct_index = question["answer"]
+        # Copie : un retardataire peut encore être ajouté par le thread MQTT pendant l'itération
+        for client_id, answer_index in list(self.answers_received[index].items()):
+            correct = (answer_index == correct_index)
+            if correct:
+                self.client_scores[client_id] += 1
+                self.scores_dirty = True
+            self.publish(f"{TOPICS['feedback']}{client_id}", json.dumps({
+                "answer_index": answer_index,
+                "correct": correct,
+                "correct_answer": correct_index
+            }))
+        self.update_scoreboard()
+
+    @PROFILEUR.chrono("finish_quiz")
+    def finish_quiz(self):
+        with self.etat_lock:
+            self.phase = "fin"
+        snapshot = self.get_snapshot()
+        self.snapshot_fin = snapshot
+
+        # ✅ Publier le classement final aux clients pour qu’ils affichent leur résultat
+        self.publish(TOPICS["fin"], snapshot.payload_fin())
+        if self.enregistreur:
+            self.enregistreur.flush()
+        return snapshot
+
+    def bilan_session(self, snapshot):
+        """Résultats de la session à historiser : joueurs classés et réussite par question."""
+        questions = []
+        for index, question in enumerate(self.questions):
+            reponses = self.answers_received[index]
+            correctes = sum(1 for answer in reponses.values() if answer == question["answer"])
+            questions.append((empreinte(question).hex(), question["question"], len(reponses), correctes))
+        return {
+            "joueurs": [(e["client_id"], e["nickname"], e["score"], e["rank"]) for e in snapshot.entrees],
+            "questions": questions
+        }
+
+    def etat_spectateur(self):
+        snapshot = self.get_snapshot()
+        with self.etat_lock:
+            phase = self.phase
+            index = self.current_question_index
+            deadline = self.deadline
+            distribution = list(self.distribution)
+        etat = {
+            "phase": phase,
+            "joueurs": len(self.clients),
+            "top": [{"rank": e["rank"], "pseudo": e["pseudo"], "score": e["score"]}
+                    for e in snapshot.entrees[:TOP_SPECTATEUR]]
+        }
+        if phase in ("question", "correction"):
+            question = self.questions[index]
+            etat.update({
+                "question_id": index,
+                "total_questions": len(self.questions),
+                "question": question["question"],
+                "options": question["options"],
+                "temps_restant": max(0, round(deadline - self.clock())),
+                "reponses": len(self.answers_received[index])
+            })
+            # Message retenu lisible par les joueurs : la répartition ne sort qu'après l'échéance
+            if phase == "correction":
+                etat["distribution"] = distribution
+                etat["correct_answer"] = question["answer"]
+        return etat
+
+    def publier_spectateur(self):
+        """Publie l'état agrégé (retenu) si il a changé depuis la dernière publication."""
+        payload = json.dumps(self.etat_spectateur())
+        if payload != self.last_spectateur:
+            self.last_spectateur = payload
+            self.publish(TOPICS["spectateur"], payload, retain=True)
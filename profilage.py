@@ -0,0 +1,212 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+# Depuis Python 3.12, cProfile repose sur sys.monitoring : un seul profil actif par processus,
+# qui voit tous les threads. Activer un second profil lève ValueError.
+PROFIL_GLOBAL = sys.version_info >= (3, 12)
+
+
+class Profileur:
+    """Instrumentation à la demande des chemins critiques du gestionnaire.
+
+    Tout est désactivé par défaut : une fonction décorée par `chrono` coûte alors
+    un test de booléen. Les fichiers produits vont dans `dossier` :
+    .pstats (snakeviz, flameprof, gprof2dot), .tracemalloc (Snapshot.load) et chronos .json.
+    """
+
+    def __init__(self, dossier="profils"):
+        self.dossier = dossier
+        self.chronos_actifs = False
+        self.capture_active = False
+        self.chronos = {}  # nom -> [appels, total, max]
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profils = []
+        self.generation = 0
+        self.metriques = {}  # nom -> fonction renvoyant un dict de compteurs
+
+    def chrono(self, nom):
+        def decorateur(fonction):
+            @functools.wraps(fonction)
+            def wrapper(*args, **kwargs):
+                if not (self.chronos_actifs or self.capture_active):
+                    return fonction(*args, **kwargs)
+                profil = None
+                if self.capture_active and not PROFIL_GLOBAL:
+                    # Le profilage ne doit jamais faire échouer l'appel instrumenté
+                    try:
+                        profil = self._entrer()
+                    except Exception as e:
+                        self._abandonner_capture(e)
+                debut = time.perf_counter()
+                try:
+                    return fonction(*args, **kwargs)
+                finally:
+                    duree = time.perf_counter() - debut
+                    if profil:
+                        self._sortir(profil)
+                    if self.chronos_actifs:
+                        self._compter(nom, duree)
+            return wrapper
+        return decorateur
+
+    def ajouter_metriques(self, nom, fonction):
+        self.metriques[nom] = fonction
+
+    def _compter(self, nom, duree):
+        with self.lock:
+            stat = self.chronos.get(nom)
+            if stat is None:
+                self.chronos[nom] = [1, duree, duree]
+            else:
+                stat[0] += 1
+                stat[1] += duree
+                if duree > stat[2]:
+                    stat[2] = duree
+
+    # Avant 3.12, cProfile ne suit que le thread qui l'active : un profil par thread (MQTT, quiz, Tk),
+    # activé uniquement pendant les appels instrumentés et fusionné à l'arrêt.
+    # À partir de 3.12, un profil unique couvre tout le processus pendant la capture.
+    def _entrer(self):
+        profondeur = getattr(self.local, "profondeur", 0)
+        profil = getattr(self.local, "profil", None)
+        if profondeur == 0 and (profil is None or self.local.generation != self.generation):
+            profil = cProfile.Profile()
+            self.local.profil = profil
+            self.local.generation = self.generation
+            with self.lock:
+                self.profils.append(profil)
+        if profondeur == 0:
+            profil.enable()
+        self.local.profondeur = profondeur + 1
+        return profil
+
+    def _abandonner_capture(self, erreur):
+        if self.capture_active:
+            self.capture_active = False
+            print(f"[profil] capture cProfile abandonnée : {erreur}")
+
+    def _sortir(self, profil):
+        self.local.profondeur -= 1
+        if self.local.profondeur == 0:
+            profil.disable()
+
+    def _chemin(self, extension):
+        os.makedirs(self.dossier, exist_ok=True)
+        return os.path.join(self.dossier, f"{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+    def demarrer_capture(self):
+        profils = []
+        if PROFIL_GLOBAL:
+            profil = cProfile.Profile()
+            try:
+                profil.enable()
+            except ValueError as e:
+                # Un autre outil (débogueur, coverage, profileur externe) occupe sys.monitoring
+                print(f"[profil] capture cProfile impossible : {e}")
+                return
+            profils.append(profil)
+        with self.lock:
+            self.profils = profils
+            self.generation += 1
+        self.capture_active = True
+        print("[profil] capture cProfile démarrée")
+
+    def arreter_capture(self):
+        self.capture_active = False
+        with self.lock:
+            profils = self.profils
+            self.profils = []
+        if PROFIL_GLOBAL:
+            for profil in profils:
+                profil.disable()
+        stats = None
+        for profil in profils:
+            # Un profil peut être encore actif dans un appel en cours : il est ignoré
+            try:
+                profil.create_stats()
+            except Exception:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profil)
+            else:
+                stats.add(profil)
+        if stats is None:
+            print("[profil] capture vide, aucun appel instrumenté")
+            return None
+        chemin = self._chemin("pstats")
+        stats.dump_stats(chemin)
+        print(f"[profil] capture écrite dans {chemin}")
+        return chemin
+
+    def rapport(self):
+        with self.lock:
+            chronos = {nom: {"appels": n, "total_ms": total * 1000, "moyenne_ms": total / n * 1000, "max_ms": pire * 1000}
+                       for nom, (n, total, pire) in self.chronos.items()}
+        metriques = {nom: fonction() for nom, fonction in self.metriques.items()}
+        chemin = self._chemin("chronos.json")
+        with open(chemin, "w", encoding="utf-8") as f:
+            json.dump({"chronos": chronos, "metriques": metriques}, f, indent=4, ensure_ascii=False)
+        for nom, c in sorted(chronos.items(), key=lambda x: -x[1]["total_ms"]):
+            print(f"[profil] {nom:<20} {c['appels']:>8} appels  moy {c['moyenne_ms']:.3f} ms  max {c['max_ms']:.3f} ms")
+        for nom, compteurs in metriques.items():
+            print(f"[profil] {nom} : " + ", ".join(f"{k}={v}" for k, v in sorted(compteurs.items())))
+        return chemin
+
+    def snapshot_memoire(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            print("[profil] tracemalloc démarré, refaire la commande pour un snapshot")
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        chemin = self._chemin("tracemalloc")
+        snapshot.dump(chemin)
+        for stat in snapshot.statistics("lineno")[:10]:
+            print(f"[profil] {stat}")
+        print(f"[profil] snapshot mémoire écrit dans {chemin}")
+        return chemin
+
+    def commande(self, nom):
+        if nom == "chronos_on":
+            self.chronos_actifs = True
+        elif nom == "chronos_off":
+            self.chronos_actifs = False
+        elif nom == "rapport":
+            return self.rapport()
+        elif nom == "cprofile_start":
+            self.demarrer_capture()
+        elif nom == "cprofile_stop":
+            return self.arreter_capture()
+        elif nom == "memoire_start" or nom == "memoire_snapshot":
+            return self.snapshot_memoire()
+        elif nom == "memoire_stop":
+            tracemalloc.stop()
+        else:
+            print(f"[profil] commande inconnue : {nom}")
+        return None
+
+    def installer_signaux(self):
+        """SIGUSR1 démarre/arrête la capture cProfile, SIGUSR2 prend un snapshot mémoire (Unix)."""
+        if not hasattr(signal, "SIGUSR1"):
+            return
+
+        def basculer_capture(signum, frame):
+            if self.capture_active:
+                self.arreter_capture()
+            else:
+                self.demarrer_capture()
+
+        signal.signal(signal.SIGUSR1, basculer_capture)
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.snapshot_memoire())
+
+
+# Profileur partagé par le moteur et le gestionnaire
+PROFILEUR = Profileur()
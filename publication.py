@@ -0,0 +1,195 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+import uuid
+import zlib
+import paho.mqtt.client as mqtt
+
+# Messages retirés de la file à chaque réveil du thread d'envoi
+TAILLE_LOT = 64
+# Au-delà, les nouveaux messages sont abandonnés (broker injoignable ou trop lent)
+TAILLE_FILE_MAX = 10000
+# Attente maximale du broker avant d'abandonner un lot
+ATTENTE_CONNEXION = 5.0
+# Topics d'état : seule la dernière valeur compte, les précédentes d'un même lot sont sautées
+COALESCABLES = {"quiz/classement", "quiz/spectateur"}
+
+
+class ConnexionPublication:
+    """Une connexion au broker et sa file d'envoi bornée, vidée par un thread dédié.
+
+    Le thread retire jusqu'à TAILLE_LOT messages par réveil et saute les états périmés
+    (COALESCABLES) ; chaque message reste un appel client.publish, que paho écrit sur
+    le socket depuis son propre thread réseau. Le gain vient de la coalescence et de
+    l'appelant qui ne touche jamais au socket, pas d'écritures groupées.
+    """
+
+    def __init__(self, broker, port, nom):
+        self.file = queue.Queue(maxsize=TAILLE_FILE_MAX)
+        self.publies = 0
+        self.coalesces = 0
+        self.abandonnes = 0
+        self.lots = 0
+        self.profondeur_max = 0
+        self.connecte = threading.Event()
+
+        self.client = mqtt.Client(client_id=nom)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.connect_async(broker, port)
+        self.client.loop_start()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.connecte.set()
+
+    def on_disconnect(self, client, userdata, rc):
+        self.connecte.clear()
+
+    def envoyer(self, topic, payload, retain):
+        # Le thread du quiz ne doit jamais bloquer sur un broker lent
+        try:
+            self.file.put_nowait((topic, payload, retain))
+        except queue.Full:
+            self.abandonnes += 1
+            return
+        profondeur = self.file.qsize()
+        if profondeur > self.profondeur_max:
+            self.profondeur_max = profondeur
+
+    def run(self):
+        while True:
+            lot = [self.file.get()]
+            while len(lot) < TAILLE_LOT:
+                try:
+                    lot.append(self.file.get_nowait())
+                except queue.Empty:
+                    break
+            self.publier_lot(lot)
+
+    def publier_lot(self, lot):
+        # En QoS 0, paho jette ce qui est publié hors connexion : on attend le broker, un temps borné
+        if not self.connecte.wait(ATTENTE_CONNEXION):
+            self.abandonnes += len(lot)
+            return
+        derniers = {}
+        for i, (topic, _, _) in enumerate(lot):
+            if topic in COALESCABLES:
+                derniers[topic] = i
+        for i, (topic, payload, retain) in enumerate(lot):
+            if topic in derniers and derniers[topic] != i:
+                self.coalesces += 1
+                continue
+            self.client.publish(topic, payload, retain=retain)
+            self.publies += 1
+        self.lots += 1
+
+
+class PoolPublication:
+    """Plusieurs connexions sortantes ; un topic est toujours routé vers la même connexion
+    pour garder l'ordre des messages d'un topic."""
+
+    def __init__(self, broker, port, taille=4):
+        prefixe = f"quiz-pub-{uuid.uuid4().hex[:6]}"
+        self.connexions = [ConnexionPublication(broker, port, f"{prefixe}-{i}") for i in range(taille)]
+
+    def connexion(self, topic):
+        return self.connexions[zlib.crc32(topic.encode("utf-8")) % len(self.connexions)]
+
+    def publish(self, topic, payload, retain=False):
+        self.connexion(topic).envoyer(topic, payload, retain)
+
+    def en_attente(self):
+        return sum(c.file.qsize() for c in self.connexions)
+
+    def metriques(self):
+        return {
+            f"connexion_{i}": {
+                "file": c.file.qsize(),
+                "file_max": c.profondeur_max,
+                "publies": c.publies,
+                "coalesces": c.coalesces,
+                "abandonnes": c.abandonnes,
+                "lots": c.lots
+            }
+            for i, c in enumerate(self.connexions)
+        }
+
+    def close(self):
+        for c in self.connexions:
+            c.client.loop_stop()
+            c.client.disconnect()
+
+
+def verifier(broker, port, connexions, messages, topics):
+    """Publie `messages` messages numérotés sur `topics` topics et vérifie réception et ordre par topic."""
+    racine = f"verif/{uuid.uuid4().hex[:6]}"
+    recus = {}
+    desordres = 0
+    fini = threading.Event()
+    lock = threading.Lock()
+
+    def on_message(client, userdata, msg):
+        nonlocal desordres
+        numero = json.loads(msg.payload)["n"]
+        with lock:
+            precedent = recus.get(msg.topic, -1)
+            if numero <= precedent:
+                desordres += 1
+            recus[msg.topic] = numero
+            if sum(v + 1 for v in recus.values()) >= messages:
+                fini.set()
+
+    abonne = mqtt.Client()
+    abonne.on_message = on_message
+    abonne.connect(broker, port)
+    abonne.subscribe(f"{racine}/#", qos=0)
+    abonne.loop_start()
+    time.sleep(0.5)
+
+    pool = PoolPublication(broker, port, connexions)
+    time.sleep(0.5)
+    compteurs = [0] * topics
+    debut = time.perf_counter()
+    for i in range(messages):
+        t = i % topics
+        pool.publish(f"{racine}/{t}", json.dumps({"n": compteurs[t]}))
+        compteurs[t] += 1
+    fini.wait(timeout=30)
+    duree = time.perf_counter() - debut
+
+    with lock:
+        total = sum(v + 1 for v in recus.values())
+    print(f"{connexions} connexion(s) : {total}/{messages} reçus en {duree:.2f} s "
+          f"({total / duree:.0f} msg/s), {desordres} hors ordre")
+    print(json.dumps(pool.metriques(), indent=4))
+    pool.close()
+    abonne.loop_stop()
+    abonne.disconnect()
+    return total == messages and desordres == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérifie le pool de publication contre un broker local.")
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--connexions", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=200)
+    args = parser.parse_args()
+
+    ok = True
+    for n in sorted({1, args.connexions}):
+        ok = verifier(args.broker, args.port, n, args.messages, args.topics) and ok
+    if not ok:
+        print("❌ Messages perdus ou désordonnés")
+        sys.exit(1)
+    print("✅ Tous les messages reçus, ordre respecté par topic")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import sys
+import time
+from collections import deque, Counter
+from enregistrement import lire_trace, ENTRANT, SORTANT, EVENEMENT, EVENEMENT_DEMARRAGE
+from moteur import MoteurQuiz, TOPICS
+
+
+class HorlogeVirtuelle:
+    """Remplace time.sleep : avancer l'horloge livre les messages entrants arrivés entre-temps.
+
+    vitesse=None rejoue aussi vite que possible, sinon 1 (temps réel), 10 (10x)...
+    """
+
+    def __init__(self, entrants, livrer, debut=0.0, vitesse=None):
+        self.entrants = deque(entrants)
+        self.livrer = livrer
+        self.maintenant = debut
+        self.vitesse = vitesse
+
+    def clock(self):
+        return self.maintenant
+
+    def sleep(self, duree):
+        self.avancer(self.maintenant + duree)
+
+    def avancer(self, fin):
+        while self.entrants and self.entrants[0][0] <= fin:
+            instant, topic, payload = self.entrants.popleft()
+            self._attendre(instant - self.maintenant)
+            self.maintenant = max(self.maintenant, instant)
+            self.livrer(topic, payload)
+        self._attendre(fin - self.maintenant)
+        self.maintenant = max(self.maintenant, fin)
+
+    def _attendre(self, duree):
+        if self.vitesse and duree > 0:
+            time.sleep(duree / self.vitesse)
+
+
+def rejouer(chemin, vitesse=None):
+    """Rejoue une trace dans un MoteurQuiz sans broker et compare le résultat à l'enregistrement."""
+    entrants = []
+    demarrages = []
+    fin_enregistree = None
+    scores_enregistres = Counter()
+    nb_sortants = 0
+    for instant, kind, topic, payload in lire_trace(chemin):
+        if kind == ENTRANT:
+            entrants.append((instant, topic, payload))
+        elif kind == SORTANT:
+            nb_sortants += 1
+            if topic == TOPICS["fin"]:
+                fin_enregistree = json.loads(payload.decode())
+            elif topic.startswith(TOPICS["feedback"]):
+                # quiz/fin ne porte que le haut du classement : les scores viennent des corrections
+                if json.loads(payload.decode()).get("correct"):
+                    scores_enregistres[topic[len(TOPICS["feedback"]):]] += 1
+        elif kind == EVENEMENT and topic == EVENEMENT_DEMARRAGE:
+            demarrages.append((instant, json.loads(payload.decode())))
+
+    produits = []
+    moteur = None
+
+    def livrer(topic, payload):
+        moteur.on_message(topic, payload)
+
+    horloge = HorlogeVirtuelle(entrants, livrer, vitesse=vitesse)
+    moteur = MoteurQuiz(publish=lambda topic, payload, retain=False: produits.append((topic, payload)),
+                        sleep=horloge.sleep, clock=horloge.clock)
+
+    t_debut = time.perf_counter()
+    for instant, demarrage in demarrages:
+        horloge.avancer(instant)
+        moteur.start(demarrage["questions"], demarrage["timer"])
+        moteur.run_quiz()
+    if entrants:
+        horloge.avancer(entrants[-1][0])
+    duree_reelle = time.perf_counter() - t_debut
+
+    fin_rejouee = next((json.loads(p) for t, p in reversed(produits) if t == TOPICS["fin"]), None)
+    ecarts = comparer(fin_enregistree, fin_rejouee, scores_enregistres, moteur.client_scores, moteur.nicknames)
+
+    return {
+        "entrants": len(entrants),
+        "sortants_enregistres": nb_sortants,
+        "sortants_rejoues": len(produits),
+        "topics_rejoues": Counter(t.rsplit("/", 1)[0] if t.startswith(TOPICS["feedback"]) else t for t, _ in produits),
+        "duree_virtuelle": horloge.maintenant,
+        "duree_reelle": duree_reelle,
+        "ecarts": ecarts
+    }
+
+
+def comparer(fin_enregistree, fin_rejouee, scores_enregistres, scores, nicknames):
+    if fin_enregistree is None:
+        return ["aucun quiz/fin dans la trace"]
+    if fin_rejouee is None:
+        return ["le rejeu n'a pas publié quiz/fin"]
+
+    ecarts = []
+    if scores_enregistres:
+        joueurs = set(scores_enregistres) | {c for c, score in scores.items() if score}
+    else:
+        # Trace sans corrections enregistrées : seuls les joueurs de quiz/fin sont vérifiables
+        scores_enregistres = {p["client_id"]: p["score"] for p in fin_enregistree["classement"]}
+        joueurs = set(scores_enregistres)
+    for cid in sorted(joueurs):
+        enregistre = scores_enregistres.get(cid, 0)
+        rejoue = scores.get(cid, 0)
+        if rejoue != enregistre:
+            ecarts.append(f"score de {nicknames.get(cid, cid)} : enregistré {enregistre}, rejoué {rejoue}")
+    # Les traces antérieures à la diffusion du seul haut de classement portent la liste complète
+    haut = len(fin_rejouee["classement"])
+    if fin_rejouee["classement"] != fin_enregistree["classement"][:haut]:
+        ecarts.append("classement de quiz/fin différent")
+    return ecarts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejoue une trace enregistrée par le gestionnaire.")
+    parser.add_argument("trace")
+    parser.add_argument("--vitesse", default="max", help="1 pour le temps réel, N pour Nx, max (défaut)")
+    args = parser.parse_args()
+
+    vitesse = None if args.vitesse == "max" else float(args.vitesse)
+    resultat = rejouer(args.trace, vitesse)
+
+    duree_reelle = resultat["duree_reelle"]
+    print(f"Messages entrants rejoués : {resultat['entrants']}")
+    print(f"Messages sortants : {resultat['sortants_rejoues']} (enregistrés : {resultat['sortants_enregistres']})")
+    for topic, nb in sorted(resultat["topics_rejoues"].items()):
+        print(f"  {topic} : {nb}")
+    print(f"Durée virtuelle : {resultat['duree_virtuelle']:.1f} s, réelle : {duree_reelle:.3f} s "
+          f"(x{resultat['duree_virtuelle'] / max(duree_reelle, 1e-9):.0f})")
+
+    if resultat["ecarts"]:
+        print("❌ Le rejeu diffère de l'enregistrement :")
+        for ecart in resultat["ecarts"]:
+            print(f"  - {ecart}")
+        sys.exit(1)
+    print("✅ Scores et quiz/fin identiques à l'enregistrement")
+
+
+if __name__ == "__main__":
+    main()
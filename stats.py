@@ -0,0 +1,195 @@
+import argparse
+import sqlite3
+import threading
+import time
+
+FICHIER_STATS = "stats_quiz.db"
+
+# Portées des cumuls : tous temps (clé ""), par saison (clé = saison), par salle (clé = salle)
+GLOBAL = "global"
+SAISON = "saison"
+SALLE = "salle"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS joueurs (
+    id TEXT PRIMARY KEY,
+    pseudo TEXT NOT NULL,
+    vu_le REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    date REAL NOT NULL,
+    saison TEXT NOT NULL,
+    salle TEXT NOT NULL,
+    nb_questions INTEGER NOT NULL,
+    nb_joueurs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resultats (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    joueur_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    rang INTEGER NOT NULL,
+    PRIMARY KEY (session_id, joueur_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_resultats_joueur ON resultats(joueur_id, session_id DESC);
+CREATE TABLE IF NOT EXISTS cumuls (
+    portee TEXT NOT NULL,
+    cle TEXT NOT NULL,
+    joueur_id TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    parties INTEGER NOT NULL,
+    PRIMARY KEY (portee, cle, joueur_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cumuls_classement ON cumuls(portee, cle, points DESC);
+CREATE TABLE IF NOT EXISTS questions (
+    hash TEXT PRIMARY KEY,
+    texte TEXT NOT NULL,
+    posees INTEGER NOT NULL,
+    correctes INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_questions_difficulte ON questions(CAST(correctes AS REAL) / posees);
+"""
+
+
+class StatsJoueurs:
+    """Historique des sessions dans SQLite.
+
+    Les classements ne parcourent jamais `resultats` : chaque session met à jour
+    des cumuls par portée, indexés par points, et un agrégat par question.
+    """
+
+    def __init__(self, chemin=FICHIER_STATS):
+        self.chemin = chemin
+        self.lock = threading.Lock()
+        with self.connexion() as db:
+            db.executescript(SCHEMA)
+
+    def connexion(self):
+        db = sqlite3.connect(self.chemin, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def enregistrer_session_async(self, bilan, saison, salle):
+        # Écriture hors du thread du quiz : la fin de partie n'attend pas le disque
+        threading.Thread(target=self.enregistrer_session, args=(bilan, saison, salle)).start()
+
+    def enregistrer_session(self, bilan, saison, salle):
+        """Écrit une session en une seule transaction. `bilan` vient de MoteurQuiz.bilan_session()."""
+        maintenant = time.time()
+        joueurs = bilan["joueurs"]
+        with self.lock:
+            db = self.connexion()
+            try:
+                with db:
+                    session_id = db.execute(
+                        "INSERT INTO sessions (date, saison, salle, nb_questions, nb_joueurs) VALUES (?, ?, ?, ?, ?)",
+                        (maintenant, saison, salle, len(bilan["questions"]), len(joueurs))
+                    ).lastrowid
+                    db.executemany(
+                        "INSERT INTO joueurs (id, pseudo, vu_le) VALUES (?, ?, ?) "
+                        "ON CONFLICT(id) DO UPDATE SET pseudo = excluded.pseudo, vu_le = excluded.vu_le",
+                        [(cid, pseudo, maintenant) for cid, pseudo, _, _ in joueurs]
+                    )
+                    db.executemany(
+                        "INSERT INTO resultats (session_id, joueur_id, score, rang) VALUES (?, ?, ?, ?)",
+                        [(session_id, cid, score, rang) for cid, _, score, rang in joueurs]
+                    )
+                    db.executemany(
+                        "INSERT INTO cumuls (portee, cle, joueur_id, points, parties) VALUES (?, ?, ?, ?, 1) "
+                        "ON CONFLICT(portee, cle, joueur_id) DO UPDATE SET "
+                        "points = points + excluded.points, parties = parties + 1",
+                        [(portee, cle, cid, score)
+                         for cid, _, score, _ in joueurs
+                         for portee, cle in ((GLOBAL, ""), (SAISON, saison), (SALLE, salle))]
+                    )
+                    db.executemany(
+                        "INSERT INTO questions (hash, texte, posees, correctes) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(hash) DO UPDATE SET "
+                        "posees = posees + excluded.posees, correctes = correctes + excluded.correctes",
+                        [q for q in bilan["questions"] if q[2] > 0]
+                    )
+            except sqlite3.Error as e:
+                print(f"Erreur stats : {e}")
+            finally:
+                db.close()
+
+    def classement(self, portee=GLOBAL, cle="", limite=10, decalage=0):
+        db = self.connexion()
+        try:
+            return db.execute(
+                "SELECT c.joueur_id, j.pseudo, c.points, c.parties FROM cumuls c "
+                "JOIN joueurs j ON j.id = c.joueur_id "
+                "WHERE c.portee = ? AND c.cle = ? ORDER BY c.points DESC LIMIT ? OFFSET ?",
+                (portee, cle, limite, decalage)
+            ).fetchall()
+        finally:
+            db.close()
+
+    def rang(self, joueur_id, portee=GLOBAL, cle=""):
+        db = self.connexion()
+        try:
+            ligne = db.execute("SELECT points FROM cumuls WHERE portee = ? AND cle = ? AND joueur_id = ?",
+                               (portee, cle, joueur_id)).fetchone()
+            if ligne is None:
+                return None
+            devant = db.execute("SELECT COUNT(*) FROM cumuls WHERE portee = ? AND cle = ? AND points > ?",
+                                (portee, cle, ligne[0])).fetchone()[0]
+            return devant + 1, ligne[0]
+        finally:
+            db.close()
+
+    def historique(self, joueur_id, limite=20):
+        db = self.connexion()
+        try:
+            return db.execute(
+                "SELECT s.date, s.saison, s.salle, r.score, r.rang, s.nb_joueurs FROM resultats r "
+                "JOIN sessions s ON s.id = r.session_id "
+                "WHERE r.joueur_id = ? ORDER BY r.session_id DESC LIMIT ?",
+                (joueur_id, limite)
+            ).fetchall()
+        finally:
+            db.close()
+
+    def questions_difficiles(self, limite=10):
+        db = self.connexion()
+        try:
+            return db.execute(
+                "SELECT texte, posees, correctes FROM questions "
+                "ORDER BY CAST(correctes AS REAL) / posees LIMIT ?",
+                (limite,)
+            ).fetchall()
+        finally:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulte les statistiques des sessions de quiz.")
+    parser.add_argument("--base", default=FICHIER_STATS)
+    sous = parser.add_subparsers(dest="commande", required=True)
+    top = sous.add_parser("top", help="classement tous temps, par saison ou par salle")
+    top.add_argument("--saison")
+    top.add_argument("--salle")
+    top.add_argument("--limite", type=int, default=10)
+    hist = sous.add_parser("historique", help="dernières sessions d'un joueur")
+    hist.add_argument("joueur_id")
+    diff = sous.add_parser("difficiles", help="questions les moins bien réussies")
+    diff.add_argument("--limite", type=int, default=10)
+    args = parser.parse_args()
+
+    stats = StatsJoueurs(args.base)
+    if args.commande == "top":
+        portee, cle = (SAISON, args.saison) if args.saison else (SALLE, args.salle) if args.salle else (GLOBAL, "")
+        for i, (cid, pseudo, points, parties) in enumerate(stats.classement(portee, cle, args.limite), start=1):
+            print(f"{i}. {pseudo} ({cid}) - {points} pts en {parties} parties")
+    elif args.commande == "historique":
+        for date, saison, salle, score, rang, nb in stats.historique(args.joueur_id):
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(date))} [{saison}/{salle}] "
+                  f"{score} pts, place {rang}/{nb}")
+    elif args.commande == "difficiles":
+        for texte, posees, correctes in stats.questions_difficiles(args.limite):
+            print(f"{correctes / posees:.0%} de réussite ({posees} réponses) - {texte}")
+
+
+if __name__ == "__main__":
+    main()